@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2019 Gregory Thiemonge <gregory.thiemonge@gmail.com>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+
+__metaclass__ = type
+
+import fcntl
+import glob
+import hashlib
+import json
+import os
+import sys
+import time
+
+from ansible import constants as C
+from ansible.module_utils._text import to_bytes, to_native
+from ansible.module_utils.parsing.convert_bool import boolean
+from ansible.plugins.action import ActionBase
+
+try:
+    from ansible.module_utils.common.arg_spec import ArgumentSpecValidator
+except ImportError:
+    ArgumentSpecValidator = None
+
+
+def _load_module_utils():
+    """Import the gandi_livedns_api module_utils on the controller.
+
+    Module utils found next to the playbook or in a role are only shipped
+    with modules, load the copy of this tree. Ansible loads each plugin
+    from its file, outside of any package, so the plugins cannot import a
+    helper from each other: this function is repeated as is in
+    action_plugins/gandi_livedns_facts.py, lookup_plugins/gandi_livedns.py
+    and gandi_livedns/__main__.py, change them together.
+    """
+    name = 'ansible.module_utils.gandi_livedns_api'
+    if name not in sys.modules:
+        import importlib.util
+        path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                            'module_utils', 'gandi_livedns_api.py')
+        spec = importlib.util.spec_from_file_location(name, path)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[name] = module
+        spec.loader.exec_module(module)
+    return sys.modules[name]
+
+
+try:
+    from ansible.module_utils import gandi_livedns_api
+except ImportError:
+    gandi_livedns_api = _load_module_utils()
+
+
+# Polling interval while waiting for the other hosts of the task
+POLL_INTERVAL = 0.05
+
+# The hosts that submitted their records within this delay of each other
+# are applied together
+QUIET_PERIOD = 0.5
+
+
+class ActionModule(ActionBase):
+    """Run gandi_livedns on the controller, coalescing the hosts of a task.
+
+    The workers of all the hosts running the same task against the same
+    zone submit their records to a spool directory in the local temporary
+    directory of the run. One of them, holding a lock, waits for the other
+    hosts of the batch, applies all the records with a single batched
+    reconcile and writes the result of each host back to the spool.
+    """
+
+    TRANSFERS_FILES = False
+    _supports_check_mode = True
+
+    def run(self, tmp=None, task_vars=None):
+        if task_vars is None:
+            task_vars = dict()
+
+        # Set here, ActionBase sets it on the instance; the module supports it
+        self._supports_async = True
+
+        result = super(ActionModule, self).run(tmp, task_vars)
+        del tmp
+
+        args = self._task.args.copy()
+        coalesce = boolean(args.pop('coalesce', True), strict=False)
+
+        # The state and checkpoint files live on the managed host, the
+        # module reads them there
+        if not coalesce or ArgumentSpecValidator is None or args.get('zone_file') or \
+                args.get('state_file') or args.get('checkpoint_file') or self._task.async_val or \
+                boolean(args.get('exclusive', False), strict=False):
+            wrap_async = self._task.async_val and not self._connection.has_native_async
+            result.update(self._execute_module(module_name='gandi_livedns',
+                                               module_args=args,
+                                               task_vars=task_vars,
+                                               wrap_async=wrap_async))
+            if not wrap_async:
+                self._remove_tmp_path(self._connection._shell.tmpdir)
+            if result.get('changed') and not self._play_context.check_mode and \
+                    (args.get('zone') or args.get('domain')):
+                gandi_livedns_api.drop_shared_zone_records(C.DEFAULT_LOCAL_TMP, args)
+            return result
+
+        spec = gandi_livedns_api.gandi_livedns_record_spec()
+        validator = ArgumentSpecValidator(**spec)
+        validation = validator.validate(args)
+        if validation.error_messages:
+            result.update(failed=True, msg=', '.join(validation.error_messages))
+            return result
+
+        params = validation.validated_parameters
+        error = gandi_livedns_api.check_record_params(params)
+        if error:
+            result.update(failed=True, msg=error)
+            return result
+
+        result.update(self._coalesce(params, task_vars))
+        return result
+
+    def _invocation(self, host_id):
+        """Return how many times the task already ran for the host.
+
+        The items of a loop and the attempts of until run the same task
+        one after the other in the worker of the host, the nth runs of all
+        the hosts are coalesced together.
+        """
+        path = os.path.join(C.DEFAULT_LOCAL_TMP, 'gandi_livedns-{0}-{1}.count'.format(
+            self._task._uuid, host_id))
+        count = gandi_livedns_api.read_json_file(path) or 0
+        gandi_livedns_api.write_json_file(path, count + 1)
+        return count
+
+    def _coalesce(self, params, task_vars):
+        check_mode = bool(self._play_context.check_mode)
+        host = task_vars.get('inventory_hostname')
+        host_id = hashlib.sha1(to_bytes(host)).hexdigest()
+        group = hashlib.sha1(to_bytes(json.dumps([
+            self._task._uuid, self._invocation(host_id), check_mode,
+            [params[k] for k in sorted(gandi_livedns_api.gandi_livedns_argument_spec())],
+        ]))).hexdigest()
+        spool = os.path.join(C.DEFAULT_LOCAL_TMP, 'gandi_livedns-{0}'.format(group))
+        if not os.path.isdir(spool):
+            try:
+                os.makedirs(spool, 0o700)
+            except OSError:
+                # Created by another worker in the meantime
+                pass
+
+        gandi_livedns_api.write_json_file(os.path.join(spool, 'req-{0}.json'.format(host_id)), {
+            'host': host,
+            'single': params['records'] is None,
+            'records': gandi_livedns_api.record_entries(params),
+        })
+
+        expected = len(task_vars.get('ansible_play_batch', [])) or 1
+        result_path = os.path.join(spool, 'res-{0}.json'.format(host_id))
+        with open(os.path.join(spool, 'lock'), 'a') as lock:
+            while not os.path.exists(result_path):
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except (IOError, OSError):
+                    time.sleep(POLL_INTERVAL)
+                    continue
+                try:
+                    if not os.path.exists(result_path):
+                        self._apply(spool, params, check_mode, expected)
+                finally:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+        result = gandi_livedns_api.read_json_file(result_path)
+        os.unlink(result_path)
+        return result
+
+    def _wait_for_requests(self, spool, expected):
+        count = -1
+        last_change = time.time()
+        while True:
+            requests = glob.glob(os.path.join(spool, 'req-*.json'))
+            if len(requests) >= expected:
+                return requests
+            if len(requests) != count:
+                count = len(requests)
+                last_change = time.time()
+            elif time.time() - last_change >= QUIET_PERIOD:
+                return requests
+            time.sleep(POLL_INTERVAL)
+
+    def _apply(self, spool, params, check_mode, expected):
+        requests = []
+        for path in sorted(self._wait_for_requests(spool, expected)):
+            claimed = path[:-len('.json')] + '.claimed'
+            os.rename(path, claimed)
+            request = gandi_livedns_api.read_json_file(claimed)
+            request['result_path'] = os.path.join(
+                spool, 'res-' + os.path.basename(path)[len('req-'):])
+            requests.append(request)
+
+        entries = []
+        for request in requests:
+            entries.extend(request['records'])
+
+        try:
+            module = gandi_livedns_api.StandaloneModule(params, check_mode=check_mode)
+            api = gandi_livedns_api.GandiLiveDNSAPI(module)
+            zone_id = None
+            if api.zone:
+                zone_id = api._get_zone_id(api.zone)
+            try:
+                results, changed, purged = api.reconcile_records(entries, zone_id=zone_id,
+                                                                 domain=api.domain,
+                                                                 verify=params['verify'])
+            finally:
+                # The copy of the zone read by the lookup and the shared
+                # facts is outdated, even by a partial update
+                if not check_mode:
+                    gandi_livedns_api.drop_shared_zone_records(C.DEFAULT_LOCAL_TMP, params)
+        except Exception as e:
+            for request in requests:
+                gandi_livedns_api.write_json_file(request['result_path'], {
+                    'failed': True,
+                    'msg': to_native(e),
+                })
+            return
+
+        for request in requests:
+            items = results[:len(request['records'])]
+            results = results[len(request['records']):]
+
+            res = {'changed': any(item['changed'] for item in items)}
+            errors = [item['msg'] for item in items if item.get('failed')]
+            if errors:
+                res['failed'] = True
+                res['msg'] = '; '.join(errors)
+            if not request['single']:
+                res['result'] = {'records': items}
+            elif items[0]['state'] == 'present':
+                res['result'] = {'record': items[0]['record']}
+            # The API calls are shared by all the hosts of the batch
+            res.update(api.diagnostics_result())
+            gandi_livedns_api.write_json_file(request['result_path'], res)
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2019 Gregory Thiemonge <gregory.thiemonge@gmail.com>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+
+__metaclass__ = type
+
+import os
+import sys
+
+from functools import partial
+
+from ansible import constants as C
+from ansible.module_utils._text import to_native
+from ansible.module_utils.parsing.convert_bool import boolean
+from ansible.plugins.action import ActionBase
+
+try:
+    from ansible.module_utils.common.arg_spec import ArgumentSpecValidator
+except ImportError:
+    ArgumentSpecValidator = None
+
+
+def _load_module_utils():
+    # Copy of _load_module_utils() in action_plugins/gandi_livedns.py
+    name = 'ansible.module_utils.gandi_livedns_api'
+    if name not in sys.modules:
+        import importlib.util
+        path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                            'module_utils', 'gandi_livedns_api.py')
+        spec = importlib.util.spec_from_file_location(name, path)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[name] = module
+        spec.loader.exec_module(module)
+    return sys.modules[name]
+
+
+try:
+    from ansible.module_utils import gandi_livedns_api
+except ImportError:
+    gandi_livedns_api = _load_module_utils()
+
+
+class ActionModule(ActionBase):
+    """Run gandi_livedns_facts on the controller, sharing the zones.
+
+    The records of each zone are fetched once per playbook run and kept in
+    the local temporary directory of the run, where the gandi_livedns
+    lookup also finds them. The facts of each host only get a reference to
+    the zone and the records matching its record and type filters.
+    """
+
+    TRANSFERS_FILES = False
+    _supports_check_mode = True
+
+    def run(self, tmp=None, task_vars=None):
+        if task_vars is None:
+            task_vars = dict()
+
+        result = super(ActionModule, self).run(tmp, task_vars)
+        del tmp
+
+        args = self._task.args.copy()
+        shared = boolean(args.pop('shared', False), strict=False)
+
+        if not shared or ArgumentSpecValidator is None or args.get('zone_file') or \
+                boolean(args.get('track_changes', False), strict=False):
+            result.update(self._execute_module(module_name='gandi_livedns_facts',
+                                               module_args=args,
+                                               task_vars=task_vars))
+            return result
+
+        spec = gandi_livedns_api.gandi_livedns_facts_spec()
+        validator = ArgumentSpecValidator(**spec)
+        validation = validator.validate(args)
+        if validation.error_messages:
+            result.update(failed=True, msg=', '.join(validation.error_messages))
+            return result
+
+        params = validation.validated_parameters
+        if params['zones'] is None and params['domains'] is None:
+            if not params['zone'] and not params['domain']:
+                result.update(failed=True,
+                              msg="At least one of zone, domain, zones and domains parameters need to be defined.")
+                return result
+            try:
+                facts = self._view(params, params['zone'], params['domain'])
+            except gandi_livedns_api.GandiLiveDNSError as e:
+                result.update(failed=True, msg=to_native(e))
+                return result
+        else:
+            facts = self._views(params, result)
+
+        result.update(changed=False, ansible_facts={'gandi_livedns_facts': facts})
+        return result
+
+    def _views(self, params, result):
+        names = [('zones', z) for z in params['zones'] or []]
+        names += [('domains', gandi_livedns_api.lowercase_string(d)) for d in params['domains'] or []]
+
+        tasks = []
+        for kind, name in names:
+            if kind == 'zones':
+                tasks.append(partial(self._view, params, name, None))
+            else:
+                tasks.append(partial(self._view, params, None, name))
+
+        api = gandi_livedns_api.GandiLiveDNSAPI(gandi_livedns_api.StandaloneModule(params))
+        facts = {'zones': {}, 'domains': {}}
+        for (kind, name), (view, error) in zip(names, api.run_parallel(tasks)):
+            if error:
+                facts[kind][name] = {'failed': True, 'msg': error}
+                result.setdefault('warnings', []).append(
+                    "Failed to retrieve the records of {0}: {1}".format(name, error))
+            else:
+                facts[kind][name] = view
+        return facts
+
+    def _view(self, params, zone, domain):
+        domain = gandi_livedns_api.lowercase_string(domain)
+        records = gandi_livedns_api.shared_zone_records(
+            C.DEFAULT_LOCAL_TMP, dict(params, zone=zone, domain=domain))
+
+        if zone:
+            view = {'zone': zone}
+        else:
+            view = {'domain': domain}
+
+        name = gandi_livedns_api.lowercase_string(params['record'])
+        type = params['type']
+        if name is None and type is None:
+            # The records stay in the shared copy of the zone
+            return view
+
+        selected = []
+        for record in records:
+            if (name is None or record['name'] == name) and \
+                    (type is None or record['type'] == type):
+                if params['compact']:
+                    record = dict((k, v) for k, v in record.items() if k not in ('zone', 'domain'))
+                selected.append(record)
+
+        if params['index']:
+            index = {}
+            for record in selected:
+                index.setdefault(record['name'], {})[record['type']] = record
+            view['index'] = index
+        else:
+            view['records'] = selected
+        return view
@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2019 Gregory Thiemonge <gregory.thiemonge@gmail.com>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+"""Local stand-in for the Gandi LiveDNS v5 API.
+
+It implements the endpoints used by the modules and plugins:
+
+- GET /zones and /zones/<uuid>
+- GET, POST, PUT /zones/<uuid>/records and /domains/<name>/records
+- GET, PUT, DELETE .../records/<name> and .../records/<name>/<type>
+
+Zones are kept in memory. The server can add latency to every request,
+answer a fraction of them with temporary errors and compress its responses
+with gzip, and it counts the requests it receives.
+
+Run it standalone to point a playbook at it::
+
+    python benchmarks/livedns_stub.py --port 8080 --records 1000 --latency 0.05
+
+The modules use it once GandiLiveDNSAPI.api_endpoint is set to
+http://127.0.0.1:8080/api/v5 (see run_benchmarks.py).
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import gzip
+import hashlib
+import json
+import random
+import threading
+import time
+import uuid
+
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+try:
+    from http.server import ThreadingHTTPServer
+except ImportError:
+    from socketserver import ThreadingMixIn
+
+    class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+        daemon_threads = True
+
+BASE_PATH = '/api/v5'
+
+
+class LiveDNSState(object):
+    """Zones, settings and counters shared by the request handlers."""
+
+    def __init__(self, latency=0, error_rate=0, gzip=True):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.gzip = gzip
+        self.zones = {}
+        self.domains = {}
+        self.lock = threading.RLock()
+        self.reset_counters()
+
+    def reset_counters(self):
+        self.requests = []
+        self.bytes_sent = 0
+
+    def add_zone(self, name, records=0, type='A', ttl=10800):
+        """Create a zone, also served as a domain, with generated records."""
+        zone_id = str(uuid.uuid4())
+        rrsets = OrderedDict()
+        for i in range(records):
+            rrsets[('h{0}'.format(i), type)] = {
+                'rrset_name': 'h{0}'.format(i),
+                'rrset_type': type,
+                'rrset_ttl': ttl,
+                'rrset_values': ['198.51.{0}.{1}'.format(i // 250 % 250, i % 250)],
+            }
+        with self.lock:
+            for zid in [k for k, z in self.zones.items() if z['name'] == name]:
+                del self.zones[zid]
+            self.zones[zone_id] = {'name': name, 'records': rrsets, 'serial': 1}
+            self.domains[name] = zone_id
+        return zone_id
+
+    def zone(self, kind, key):
+        if kind == 'domains':
+            key = self.domains.get(key)
+        return self.zones.get(key)
+
+    def zone_records(self, kind, key):
+        zone = self.zone(kind, key)
+        if zone is None:
+            return None
+        return zone['records']
+
+
+class LiveDNSHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately
+    disable_nagle_algorithm = True
+    state = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body=None, content_type='application/json', headers=None):
+        if body is None:
+            data = b''
+        elif content_type == 'application/json':
+            data = json.dumps(body).encode('utf-8')
+        else:
+            data = body.encode('utf-8')
+
+        extra = dict(headers or {})
+        if self.command == 'GET' and status == 200:
+            etag = '"{0}"'.format(hashlib.sha1(data).hexdigest())
+            if self.headers.get('If-None-Match') == etag:
+                status, data = 304, b''
+            extra['ETag'] = etag
+        if data and self.state.gzip and 'gzip' in (self.headers.get('Accept-Encoding') or ''):
+            data = gzip.compress(data)
+            extra['Content-Encoding'] = 'gzip'
+
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        for k, v in extra.items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(data)
+        with self.state.lock:
+            self.state.bytes_sent += len(data)
+
+    def _payload(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if not length:
+            return None
+        return json.loads(self.rfile.read(length).decode('utf-8'))
+
+    def _handle(self):
+        # The body is read first so that the connection can be reused
+        payload = self._payload()
+        state = self.state
+        with state.lock:
+            state.requests.append((self.command, self.path))
+
+        if state.latency:
+            time.sleep(state.latency)
+        if state.error_rate and random.random() < state.error_rate:
+            return self._send(503, {'message': 'Service unavailable'}, headers={'Retry-After': '0'})
+        if self.headers.get('X-Api-Key') is None:
+            return self._send(401, {'message': 'Missing API key'})
+
+        if not self.path.startswith(BASE_PATH + '/'):
+            return self._send(404, {'message': 'Not found'})
+        parts = self.path[len(BASE_PATH) + 1:].split('/')
+
+        if parts == ['zones'] and self.command == 'GET':
+            with state.lock:
+                zones = [{'uuid': k, 'name': z['name']} for k, z in state.zones.items()]
+            return self._send(200, zones)
+
+        if len(parts) == 2 and parts[0] == 'zones' and self.command == 'GET':
+            with state.lock:
+                zone = state.zones.get(parts[1])
+            if zone is None:
+                return self._send(404, {'message': 'Unknown zone'})
+            return self._send(200, {'uuid': parts[1], 'name': zone['name'], 'serial': zone['serial']})
+
+        if len(parts) < 3 or parts[0] not in ('zones', 'domains') or parts[2] != 'records':
+            return self._send(404, {'message': 'Not found'})
+
+        with state.lock:
+            zone = state.zone(parts[0], parts[1])
+            if zone is None:
+                return self._send(404, {'message': 'Unknown zone'})
+            if self.command != 'GET':
+                zone['serial'] += 1
+            return self._records(zone['records'], parts[3:], payload)
+
+    def _records(self, records, names, payload):
+        command = self.command
+
+        if not names:
+            if command == 'GET':
+                if 'text/plain' in (self.headers.get('Accept') or ''):
+                    lines = ['{0} {1} IN {2} {3}'.format(r['rrset_name'], r['rrset_ttl'],
+                                                         r['rrset_type'], v)
+                             for r in records.values() for v in r['rrset_values']]
+                    return self._send(200, '\n'.join(lines) + '\n', content_type='text/plain')
+                return self._send(200, list(records.values()))
+            if command == 'POST':
+                key = (payload['rrset_name'], payload['rrset_type'])
+                if key in records:
+                    return self._send(409, {'message': 'A record with that name / type pair already exists'})
+                records[key] = dict(payload)
+                return self._send(201, {'message': 'DNS Record Created'})
+            if command == 'PUT':
+                records.clear()
+                for item in payload['items']:
+                    records[(item['rrset_name'], item['rrset_type'])] = dict(item)
+                return self._send(201, {'message': 'DNS Zone Replaced'})
+            return self._send(405, {'message': 'Method not allowed'})
+
+        name = names[0]
+        type = names[1] if len(names) > 1 else None
+        if type:
+            matching = [(name, type)] if (name, type) in records else []
+        else:
+            matching = [k for k in records if k[0] == name]
+
+        if command == 'GET':
+            if not matching:
+                return self._send(404, {'message': 'Record not found'})
+            if type:
+                return self._send(200, records[matching[0]])
+            return self._send(200, [records[k] for k in matching])
+        if command == 'PUT' and type:
+            records[(name, type)] = {
+                'rrset_name': name,
+                'rrset_type': type,
+                'rrset_ttl': payload.get('rrset_ttl', 10800),
+                'rrset_values': payload['rrset_values'],
+            }
+            return self._send(201, {'message': 'DNS Record Created'})
+        if command == 'DELETE':
+            if not matching:
+                return self._send(404, {'message': 'Record not found'})
+            for k in matching:
+                del records[k]
+            return self._send(204)
+        return self._send(405, {'message': 'Method not allowed'})
+
+    do_GET = do_POST = do_PUT = do_DELETE = _handle
+
+
+def start_server(state, port=0):
+    """Serve state on 127.0.0.1 in a background thread, return the server."""
+    handler = type('Handler', (LiveDNSHandler,), {'state': state})
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--zone', default='example.com')
+    parser.add_argument('--records', type=int, default=10,
+                        help='number of records generated in the zone')
+    parser.add_argument('--latency', type=float, default=0,
+                        help='delay added to each request, in seconds')
+    parser.add_argument('--error-rate', type=float, default=0,
+                        help='fraction of the requests answered with a 503')
+    parser.add_argument('--no-gzip', action='store_true')
+    args = parser.parse_args()
+
+    state = LiveDNSState(latency=args.latency, error_rate=args.error_rate,
+                         gzip=not args.no_gzip)
+    state.add_zone(args.zone, args.records)
+    server = start_server(state, args.port)
+    print('Serving {0} with {1} records on http://127.0.0.1:{2}{3}'.format(
+        args.zone, args.records, server.server_port, BASE_PATH))
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        print('{0} requests'.format(len(state.requests)))
+
+
+if __name__ == '__main__':
+    main()
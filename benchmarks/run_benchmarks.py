@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2019 Gregory Thiemonge <gregory.thiemonge@gmail.com>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+"""Benchmark the gandi_livedns modules against the local LiveDNS stub.
+
+Each case runs a module operation on a zone of a given size and reports
+its wall time, the number of API requests it sent and the peak memory of
+the process running it::
+
+    python benchmarks/run_benchmarks.py
+    python benchmarks/run_benchmarks.py --sizes 10 1000 --latency 0.02 --cases get
+
+The modules run in a fresh Python process for each case, with the zone
+cache disabled so that the zone lookup is part of the measure. Ansible
+must be importable by the Python interpreter running this script.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from livedns_stub import BASE_PATH, LiveDNSState, start_server  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ZONE = 'example.com'
+
+# Run a module in process, with the module_utils of this tree and the API
+# endpoint pointing to the stub, and report its time and peak memory
+RUNNER = r'''
+import importlib.util, json, os, resource, sys, time
+
+root, endpoint, module_name, args = sys.argv[1], sys.argv[2], sys.argv[3], sys.argv[4]
+
+name = 'ansible.module_utils.gandi_livedns_api'
+spec = importlib.util.spec_from_file_location(name, os.path.join(root, 'module_utils', 'gandi_livedns_api.py'))
+module_utils = importlib.util.module_from_spec(spec)
+sys.modules[name] = module_utils
+spec.loader.exec_module(module_utils)
+module_utils.GandiLiveDNSAPI.api_endpoint = endpoint
+
+# Read like the argument of a module run by hand, by all ansible-core versions
+sys.argv = [module_name, json.dumps({'ANSIBLE_MODULE_ARGS': json.loads(args)})]
+
+sys.path.insert(0, os.path.join(root, 'library'))
+module = __import__(module_name)
+
+stdout = sys.stdout
+sys.stdout = open(os.devnull, 'w')
+start = time.time()
+try:
+    module.main()
+except SystemExit:
+    pass
+elapsed = time.time() - start
+sys.stdout = stdout
+
+# ru_maxrss accounts for the memory of the parent before exec on Linux
+maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+try:
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmHWM:'):
+                maxrss = int(line.split()[1])
+except IOError:
+    pass
+print(json.dumps({'elapsed': elapsed, 'maxrss': maxrss}))
+'''
+
+CASES = {
+    # name: (module, arguments), the zone has records named h0 to h<size-1>
+    'ensure_update': ('gandi_livedns', {'record': 'h0', 'type': 'A', 'values': ['192.0.2.1']}),
+    'ensure_create': ('gandi_livedns', {'record': 'new', 'type': 'A', 'values': ['192.0.2.1']}),
+    'ensure_unchanged': ('gandi_livedns', {'record': 'h0', 'type': 'A', 'values': ['198.51.0.0']}),
+    'delete': ('gandi_livedns', {'record': 'h0', 'type': 'A', 'state': 'absent'}),
+    'get': ('gandi_livedns_facts', {}),
+    'get_index': ('gandi_livedns_facts', {'index': True, 'compact': True}),
+}
+
+
+def run_case(state, server, python, size, case, extra_args):
+    module, args = CASES[case]
+    args = dict(args, api_key='benchmark', zone=ZONE, zone_cache_ttl=0, **extra_args)
+
+    state.add_zone(ZONE, size)
+    state.reset_counters()
+
+    endpoint = 'http://127.0.0.1:{0}{1}'.format(server.server_port, BASE_PATH)
+    start = time.time()
+    proc = subprocess.run([python, '-c', RUNNER, ROOT, endpoint, module, json.dumps(args)],
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                          universal_newlines=True)
+    wall = time.time() - start
+    if proc.returncode:
+        raise RuntimeError('{0} failed: {1}'.format(case, proc.stderr))
+
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    return {
+        'case': case,
+        'records': size,
+        'wall': wall,
+        'module': result['elapsed'],
+        'requests': len(state.requests),
+        'bytes': state.bytes_sent,
+        'maxrss_kb': result['maxrss'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 1000, 50000],
+                        help='numbers of records in the zone')
+    parser.add_argument('--cases', nargs='+', choices=sorted(CASES), default=sorted(CASES))
+    parser.add_argument('--latency', type=float, default=0,
+                        help='delay added by the stub to each request, in seconds')
+    parser.add_argument('--error-rate', type=float, default=0,
+                        help='fraction of the requests answered with a 503')
+    parser.add_argument('--no-gzip', action='store_true')
+    parser.add_argument('--use-fetch-url', action='store_true')
+    parser.add_argument('--python', default=sys.executable,
+                        help='interpreter running the modules')
+    parser.add_argument('--json', action='store_true', help='print the results as JSON')
+    args = parser.parse_args()
+
+    state = LiveDNSState(latency=args.latency, error_rate=args.error_rate,
+                         gzip=not args.no_gzip)
+    server = start_server(state)
+
+    extra_args = {}
+    if args.use_fetch_url:
+        extra_args['use_fetch_url'] = True
+
+    results = []
+    try:
+        for size in args.sizes:
+            for case in args.cases:
+                results.append(run_case(state, server, args.python, size, case, extra_args))
+                if not args.json:
+                    r = results[-1]
+                    print('{case:<18} {records:>7} records  wall {wall:7.3f}s  module {module:7.3f}s  '
+                          '{requests:>3} requests  {bytes:>10} bytes  peak RSS {maxrss_kb:>8} KB'.format(**r))
+    finally:
+        server.shutdown()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,276 @@
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2019 Gregory Thiemonge <gregory.thiemonge@gmail.com>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+"""Synchronize Gandi LiveDNS records without running a playbook.
+
+The desired state is a YAML (or JSON) file holding the parameters of the
+gandi_livedns module, e.g.::
+
+    zone: example.com
+    records:
+    - record: www
+      type: A
+      values:
+      - 192.0.2.1
+    - record: old
+      type: CNAME
+      state: absent
+
+and is applied with the same batched reconcile as the module::
+
+    python -m gandi_livedns sync desired.yaml [--check] [--exclusive]
+
+With --checkpoint FILE, the writes done are journaled to FILE and an
+interrupted sync run again with the same desired state only sends the
+writes left.
+
+A single record, such as the address of a host on a dynamic connection,
+is pushed with::
+
+    python -m gandi_livedns ddns --zone example.com --record home 192.0.2.1
+
+which records what it pushed in --state-file and sends no API request
+when the same values were pushed less than --recheck-interval seconds ago.
+
+The API key is read from the file, from --api-key or from the
+GANDI_LIVEDNS_API_KEY environment variable. The exit status is 0 on
+success and 1 on failure.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import json
+import os
+import sys
+
+
+def _load_module_utils():
+    # Copy of _load_module_utils() in action_plugins/gandi_livedns.py
+    name = 'ansible.module_utils.gandi_livedns_api'
+    if name not in sys.modules:
+        import importlib.util
+        path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                            'module_utils', 'gandi_livedns_api.py')
+        spec = importlib.util.spec_from_file_location(name, path)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[name] = module
+        spec.loader.exec_module(module)
+    return sys.modules[name]
+
+
+try:
+    from ansible.module_utils import gandi_livedns_api
+except ImportError:
+    gandi_livedns_api = _load_module_utils()
+
+try:
+    from ansible.module_utils.common.arg_spec import ArgumentSpecValidator
+except ImportError:
+    ArgumentSpecValidator = None
+
+
+class SyncError(Exception):
+    pass
+
+
+def load_desired_state(path):
+    with open(path) as f:
+        content = f.read()
+    if path.endswith('.json'):
+        try:
+            return json.loads(content)
+        except ValueError as e:
+            raise SyncError("Failed to parse {0}: {1}".format(path, e))
+
+    import yaml
+    loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+    try:
+        return yaml.load(content, Loader=loader)
+    except yaml.YAMLError as e:
+        raise SyncError("Failed to parse {0}: {1}".format(path, e))
+
+
+def build_params(desired, args):
+    """Validate the desired state like the gandi_livedns module does."""
+    if not isinstance(desired, dict):
+        raise SyncError("The desired state must be a mapping of gandi_livedns parameters")
+    if ArgumentSpecValidator is None:
+        raise SyncError("ansible-core >= 2.11 is required")
+
+    desired = dict(desired)
+    desired.setdefault('api_key', args.api_key or os.environ.get('GANDI_LIVEDNS_API_KEY'))
+    if args.exclusive:
+        desired['exclusive'] = True
+    if args.parallelism is not None:
+        desired['parallelism'] = args.parallelism
+    if args.diagnostics:
+        desired['diagnostics'] = True
+    if args.checkpoint:
+        desired['checkpoint_file'] = args.checkpoint
+
+    validation = ArgumentSpecValidator(**gandi_livedns_api.gandi_livedns_record_spec()).validate(desired)
+    if validation.error_messages:
+        raise SyncError(', '.join(validation.error_messages))
+    params = validation.validated_parameters
+
+    if params['zone_file'] is not None:
+        zone = params['zone'] or params['domain'] or ''
+        try:
+            with open(params['zone_file'], 'rb') as f:
+                rrsets = gandi_livedns_api.parse_zone_file(f, zone, ttl=params['ttl'])
+        except (IOError, OSError, ValueError) as e:
+            raise SyncError("Failed to read zone file {0}: {1}".format(params['zone_file'], e))
+        params['records'] = [{
+            'record': rrset['rrset_name'],
+            'type': rrset['rrset_type'],
+            'values': rrset['rrset_values'],
+            'ttl': rrset['rrset_ttl'],
+            'state': 'present',
+        } for rrset in rrsets]
+
+    error = gandi_livedns_api.check_record_params(params)
+    if error:
+        raise SyncError(error)
+    return params
+
+
+def sync(params, check_mode=False):
+    """Apply the records of params, return the result of the module."""
+    module = gandi_livedns_api.StandaloneModule(params, check_mode=check_mode)
+    api = gandi_livedns_api.GandiLiveDNSAPI(module)
+    entries = gandi_livedns_api.record_entries(params)
+    checkpoint = None
+    zone_id = None
+    if params['checkpoint_file'] and not check_mode:
+        checkpoint, zone_id = api.open_checkpoint(params['checkpoint_file'], entries,
+                                                  zone=api.zone, domain=api.domain,
+                                                  exclusive=params['exclusive'])
+    elif api.zone:
+        zone_id = api._get_zone_id(api.zone)
+
+    results, changed, purged = api.reconcile_records(
+        entries, zone_id=zone_id, domain=api.domain,
+        exclusive=params['exclusive'], verify=params['verify'], checkpoint=checkpoint)
+
+    result = {'changed': changed, 'records': results}
+    if purged is not None:
+        result['purged'] = purged
+    errors = [r['msg'] for r in results if r.get('failed')]
+    if errors:
+        result['failed'] = True
+        result['msg'] = "Failed to update {0} record(s): {1}".format(len(errors), '; '.join(errors))
+    result.update(api.diagnostics_result())
+    return result
+
+
+def ddns(args):
+    """Push the record of args unless the state file shows it is current."""
+    desired = {
+        'records': [{'record': args.record, 'type': args.type, 'values': args.values,
+                     'ttl': args.ttl}],
+        'zone': args.zone,
+    }
+    # Options given as None still count for the mutually exclusive checks
+    for name in ('zone_id', 'domain'):
+        if getattr(args, name) is not None:
+            desired[name] = getattr(args, name)
+    params = build_params(desired, args)
+    entry = gandi_livedns_api.record_entries(params)[0]
+    pushed = gandi_livedns_api.PushedState(args.state_file, args.recheck_interval)
+    key = pushed.key(params['api_key'], params['zone'], params['domain'], entry)
+    origin = params['zone'] or params['domain']
+    if pushed.unchanged(key, entry, origin):
+        return params, {'changed': False, 'records': [{'changed': False}]}
+
+    result = sync(params)
+    if not result.get('failed'):
+        pushed.update(key, entry, origin)
+    return params, result
+
+
+def print_summary(entries, result, out):
+    for entry, item in zip(entries, result['records']):
+        if item.get('failed'):
+            status = 'failed'
+        elif item['changed']:
+            status = 'changed'
+        else:
+            status = 'ok'
+        line = '{0:<8} {1} {2} {3}'.format(status, entry['record'], entry['type'], entry['state'])
+        if item.get('failed'):
+            line += ': ' + item['msg']
+        print(line, file=out)
+    for record in result.get('purged') or []:
+        print('{0:<8} {1} {2} absent'.format('purged', record['name'], record['type']), file=out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m gandi_livedns',
+                                     description=__doc__.splitlines()[0])
+    subparsers = parser.add_subparsers(dest='command')
+    sync_parser = subparsers.add_parser('sync', help='apply a desired state file')
+    sync_parser.add_argument('desired', help='YAML or JSON file of gandi_livedns parameters')
+    sync_parser.add_argument('--api-key', help='account API token')
+    sync_parser.add_argument('--check', action='store_true', help='only report the changes')
+    sync_parser.add_argument('--exclusive', action='store_true',
+                             help='remove the records of the zone that are not listed')
+    sync_parser.add_argument('--parallelism', type=int,
+                             help='maximum number of records written concurrently')
+    sync_parser.add_argument('--checkpoint', metavar='FILE',
+                             help='journal the writes done to FILE and resume from it')
+    sync_parser.add_argument('--diagnostics', action='store_true',
+                             help='report the API calls and timings')
+    sync_parser.add_argument('--json', action='store_true', help='print the result as JSON')
+    ddns_parser = subparsers.add_parser('ddns', help='push a single record when it changes')
+    ddns_parser.add_argument('values', nargs='+', help='values of the record')
+    origin = ddns_parser.add_mutually_exclusive_group(required=True)
+    origin.add_argument('--zone', help='zone name')
+    origin.add_argument('--domain', help='domain name')
+    ddns_parser.add_argument('--zone-id', help='UUID of the zone, to skip its lookup')
+    ddns_parser.add_argument('--record', required=True, help='name of the record')
+    ddns_parser.add_argument('--type', default='A', help='type of the record (default: A)')
+    ddns_parser.add_argument('--ttl', type=int, help='TTL of the record')
+    ddns_parser.add_argument('--api-key', help='account API token')
+    ddns_parser.add_argument('--state-file', default='~/.cache/gandi_livedns/ddns-state.json',
+                             help='file recording the pushed records (default: %(default)s)')
+    ddns_parser.add_argument('--recheck-interval', type=int, default=3600,
+                             help='seconds after which a pushed record is checked again '
+                             '(default: %(default)s)')
+    ddns_parser.add_argument('--diagnostics', action='store_true',
+                             help='report the API calls and timings')
+    ddns_parser.add_argument('--json', action='store_true', help='print the result as JSON')
+    ddns_parser.set_defaults(exclusive=False, parallelism=None, checkpoint=None)
+    args = parser.parse_args(argv)
+
+    if args.command not in ('sync', 'ddns'):
+        parser.print_usage(sys.stderr)
+        return 1
+
+    try:
+        if args.command == 'ddns':
+            params, result = ddns(args)
+        else:
+            params = build_params(load_desired_state(args.desired), args)
+            result = sync(params, check_mode=args.check)
+    except (IOError, OSError, ValueError, SyncError, gandi_livedns_api.GandiLiveDNSError) as e:
+        result = {'failed': True, 'msg': str(e)}
+        params = None
+
+    if args.json:
+        print(json.dumps(result, indent=2, sort_keys=True))
+    else:
+        if params is not None:
+            print_summary(gandi_livedns_api.record_entries(params), result, sys.stdout)
+        if result.get('failed'):
+            print('error: ' + result['msg'], file=sys.stderr)
+        elif 'diagnostics' in result:
+            print(json.dumps(result['diagnostics'], indent=2), file=sys.stderr)
+
+    return 1 if result.get('failed') else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -59,16 +59,258 @@ options:
     - Required for C(state=present).
     type: list
     aliases: [ content ]
+  values_mode:
+    description:
+    - How I(values) are applied to the values of an existing record.
+    - C(replace) sets the values of the record to I(values).
+    - C(append) adds the I(values) the record lacks to its values, and
+      C(remove) removes them, deleting the record when no value is left.
+      The TTL of the record is kept by C(remove).
+    - With C(append) and C(remove), the record is read back after it is
+      written. The API has no conditional writes, when a concurrent update
+      from another host dropped the change, the values are merged and
+      written again after a backoff delay, up to I(retries) times. This
+      lets many hosts add themselves to a shared record in a single run.
+    - Only applies to C(state=present).
+    type: str
+    choices: [ append, remove, replace ]
+    default: replace
   zone:
     description:
     - The name of the Zone to work with (e.g. "example.com").
     - The Zone must already exist.
     type: str
     required: true
+  zone_id:
+    description:
+    - The UUID of the I(zone), to use it without looking up the zone name
+      in the list of the zones.
+    - I(zone) is still required, it names the zone in the results.
+    - A wrong UUID is reported as an error, it is not looked up again.
+    - Mutually exclusive with I(domain).
+    type: str
   domain:
     description:
     - The name of the Domain to work with (e.g. "example.com").
     type: str
+  cache_dir:
+    description:
+    - Directory where the zone name to zone UUID cache is stored.
+    type: path
+    default: ~/.cache/gandi_livedns
+  zone_cache_ttl:
+    description:
+    - Number of seconds a cached zone UUID is considered valid.
+    - The cache is refreshed when a zone is not found in it or when the API
+      reports the zone of a cached UUID as not found.
+    - C(0) disables the cache.
+    type: int
+    default: 3600
+  negative_cache_ttl:
+    description:
+    - Number of seconds the zone names found missing from the zone list,
+      and the records the API reported as not found, are remembered in
+      I(cache_dir).
+    - Looking them up again within that time fails, or finds no record,
+      without any API call. E.g. repeatedly ensuring that missing records
+      are absent does not call the API again. Records that are created or
+      updated are always looked up.
+    - Writes through these modules forget the records they modify. Records
+      and zones created by other means are only seen once the entry expires.
+    - C(0) disables the cache.
+    type: int
+    default: 0
+  response_cache:
+    description:
+    - Keep the responses of the API in I(cache_dir) and revalidate them with
+      conditional requests (C(If-None-Match), C(If-Modified-Since)).
+    - An unchanged response is then not downloaded again.
+    - Writes through this module invalidate the cached responses of the
+      records they modify.
+    type: bool
+    default: false
+  validate_certs:
+    description:
+    - Whether to validate the TLS certificate of the API endpoint.
+    type: bool
+    default: true
+  retries:
+    description:
+    - Number of times a request is retried when the API answers with a rate
+      limit (429) or a temporary server error (503, and 500, 502 or 504 for
+      idempotent requests).
+    - Retries use an exponential backoff with jitter and honor the
+      C(Retry-After) header.
+    type: int
+    default: 3
+  rate_limit:
+    description:
+    - Maximum number of requests per second sent to the API, shared by all
+      the processes of the machine using the same API key (e.g. the forks
+      of a playbook run).
+    - The budget is tracked in a file of I(cache_dir).
+    - C(0) disables rate limiting.
+    type: float
+    default: 0
+  use_fetch_url:
+    description:
+    - Send each API request with Ansible's C(fetch_url) instead of reusing a
+      persistent connection.
+    - This opens a new connection for every request but honors the usual
+      C(fetch_url) settings such as proxy environment variables.
+    type: bool
+    default: false
+  records:
+    description:
+    - A list of records to manage in a single invocation.
+    - The zone records are fetched once and only the records that differ
+      from the desired state are created, updated or deleted.
+    - Mutually exclusive with I(type) and I(values).
+    type: list
+    elements: dict
+    suboptions:
+      record:
+        description:
+        - Record to manage.
+        type: str
+        default: '@'
+        aliases: [ name ]
+      type:
+        description:
+        - The type of DNS record.
+        type: str
+        required: true
+        choices: [ A, AAAA, ALIAS, CAA, CDS, CNAME, DNAME, DS, KEY, LOC, MX, NS, PTR, SPF, SRV, SSHFP, TLSA, TXT, WKS ]
+      values:
+        description:
+        - The record values.
+        - Required for C(state=present).
+        type: list
+        aliases: [ content ]
+      ttl:
+        description:
+        - The TTL of the record.
+        - Defaults to the value of the module I(ttl) option.
+        type: int
+      state:
+        description:
+        - Whether the record should exist or not.
+        - Defaults to the value of the module I(state) option.
+        type: str
+        choices: [ absent, present ]
+      values_mode:
+        description:
+        - How the values are applied to the values of the record.
+        - Defaults to the value of the module I(values_mode) option.
+        type: str
+        choices: [ append, remove, replace ]
+  zone_file:
+    description:
+    - Path to a BIND zone file describing the records to manage.
+    - The file is parsed into a list of records that are managed like
+      I(records) with C(state=present). The SOA record is ignored.
+    - Names and C($ORIGIN) directives must belong to the I(zone) or
+      I(domain).
+    - Mutually exclusive with I(records), I(type) and I(values).
+    type: path
+  coalesce:
+    description:
+    - Handled by the gandi_livedns action plugin.
+    - When enabled, the task runs on the controller and the records of all
+      the hosts running it against the same zone are applied together with
+      a single batched update, each host getting its own result.
+    - With C(loop) or C(until), the first items or attempts of all the hosts
+      are applied together, then the second ones, and so on.
+    - When disabled, or when I(zone_file), I(exclusive), I(state_file),
+      I(checkpoint_file) or C(async) are used, the module runs on the
+      target host for each host.
+    type: bool
+    default: true
+  parallelism:
+    description:
+    - Maximum number of records written concurrently when several records
+      of I(records) or I(zone_file) need to change.
+    - A failed write does not prevent the other records from being
+      written, all the errors are reported.
+    type: int
+    default: 1
+  exclusive:
+    description:
+    - Make I(records) or I(zone_file) authoritative for the zone.
+    - Records of the zone that are not listed in I(records) with
+      C(state=present) or in I(zone_file) are removed.
+    - The new content of the zone is pushed with a single request replacing
+      all the records of the zone.
+    - Requires I(records) or I(zone_file).
+    type: bool
+    default: false
+  state_file:
+    description:
+    - Path of a file, on the host running the module, recording the
+      records successfully pushed by the module.
+    - When the record was already pushed with the same values and TTL
+      less than I(recheck_interval) seconds ago, the module returns
+      without any API call. This suits hosts registering their own
+      address on a timer (dynamic DNS).
+    - Changes made to the record by other means are only detected once
+      I(recheck_interval) has elapsed.
+    - Mutually exclusive with I(records) and I(zone_file).
+    type: path
+  recheck_interval:
+    description:
+    - Number of seconds after which a record found in I(state_file) is
+      checked against the API again.
+    type: int
+    default: 3600
+  checkpoint_file:
+    description:
+    - Path of a file, on the host running the module, journaling the
+      progress of the update of I(records) or I(zone_file).
+    - The writes to send are recorded in the file before the first one,
+      and each write in it once done. When the module is interrupted or
+      some writes fail, running it again with the same parameters only
+      sends the writes left, without looking up the zone and its records
+      again. The file is removed once all the writes are done.
+    - The writes of a checkpoint are sent as planned, even if the zone was
+      changed in the meantime by other means.
+    - Combined with C(async), this lets long updates run in the background
+      and resume after a failure.
+    - Not used in check mode.
+    type: path
+  diagnostics:
+    description:
+    - Return C(diagnostics) with the details of the API calls and the time
+      spent in each phase of the module.
+    - Can also be enabled with the C(GANDI_LIVEDNS_DIAGNOSTICS) environment
+      variable.
+    type: bool
+    default: false
+  verify:
+    description:
+    - Read the records back after they have been written and fail if they
+      do not match the requested state.
+    - The returned records then come from the API instead of being built
+      from the requested state.
+    - This costs one more API call per changed record, or per zone when
+      I(records) or I(zone_file) is used.
+    type: bool
+    default: false
+notes:
+- "The values, TTLs and types of the records are checked before any API
+  call (e.g. address formats, MX priority, SRV fields, CNAME records
+  coexisting with other types), all the invalid records are reported at
+  once."
+- "Without I(verify), a single record costs at most the following API calls:
+  C(state=present) issues one C(GET) of the record followed, if it differs
+  or does not exist, by one C(PUT) or C(POST);
+  C(state=absent) issues a single C(DELETE) (a C(GET) in check mode)."
+- "When I(zone) is used, a C(GET) of the list of the zones is added when
+  its UUID is not in the zone cache. A cached UUID is checked with a
+  C(GET) of the zone the first time a record is not found, the list of the
+  zones is requested again only if the zone is not found either. Retried
+  requests (see I(retries)) are not counted."
+- "I(records) and I(zone_file) cost one C(GET) of the whole zone plus one
+  request per changed record, or a single C(PUT) with I(exclusive)."
 '''
 
 EXAMPLES = r'''
@@ -109,6 +351,101 @@ EXAMPLES = r'''
     record: mail
     api_key: dummyapitoken
     state: absent
+
+- name: Manage several records of the my.com zone at once
+  gandi_livedns:
+    zone: my.com
+    api_key: dummyapitoken
+    records:
+    - record: www
+      type: A
+      values:
+      - 192.0.2.91
+    - record: mail
+      type: CNAME
+      values:
+      - www
+      ttl: 300
+    - record: old
+      type: A
+      state: absent
+
+- name: Add the address of each host to the round-robin record of my.com
+  gandi_livedns:
+    zone: my.com
+    record: pool
+    type: A
+    values:
+    - "{{ ansible_default_ipv4.address }}"
+    values_mode: append
+    ttl: 300
+    api_key: dummyapitoken
+
+- name: Remove a host from the round-robin record
+  gandi_livedns:
+    zone: my.com
+    record: pool
+    type: A
+    values:
+    - 192.0.2.12
+    values_mode: remove
+    api_key: dummyapitoken
+
+- name: Apply a large zone file in the background, resuming after a failure
+  gandi_livedns:
+    zone: my.com
+    zone_file: files/my.com.zone
+    checkpoint_file: /var/lib/gandi_livedns/my.com.checkpoint
+    parallelism: 8
+    api_key: dummyapitoken
+  async: 3600
+  poll: 30
+  register: sync
+  until: sync is succeeded
+  retries: 3
+
+- name: Replace all the records of the my.com zone
+  gandi_livedns:
+    zone: my.com
+    api_key: dummyapitoken
+    exclusive: true
+    records:
+    - record: '@'
+      type: A
+      values:
+      - 192.0.2.1
+    - record: www
+      type: CNAME
+      values:
+      - '@'
+
+- name: Register the A record of every host, applied in a single update
+  gandi_livedns:
+    zone: my.com
+    record: "{{ inventory_hostname_short }}"
+    type: A
+    values:
+    - "{{ ansible_default_ipv4.address }}"
+    api_key: dummyapitoken
+
+- name: Register the public address of the host, only calling the API on change
+  gandi_livedns:
+    zone: my.com
+    record: "{{ inventory_hostname_short }}"
+    type: A
+    values:
+    - "{{ public_ipv4 }}"
+    ttl: 300
+    state_file: /var/lib/gandi_livedns/ddns.json
+    recheck_interval: 86400
+    api_key: dummyapitoken
+
+- name: Synchronize the my.com zone with a BIND zone file
+  gandi_livedns:
+    zone: my.com
+    api_key: dummyapitoken
+    zone_file: files/my.com.zone
+    exclusive: true
 '''
 
 RETURN = r'''
@@ -149,218 +486,130 @@ record:
             returned: success
             type: str
             sample: my.com
+records:
+    description:
+    - A list containing the result of each entry of I(records).
+    - Each item contains the C(record) dictionary (see above, not returned
+      for deleted records), its C(state) and whether it was C(changed).
+    - Items whose update failed have C(failed) set and the error in C(msg).
+    returned: success, when I(records) or I(zone_file) is set
+    type: list
+    sample:
+    - record:
+        name: www
+        type: A
+        ttl: 10800
+        values:
+        - 192.0.2.91
+        zone: my.com
+      state: present
+      changed: true
+purged:
+    description:
+    - A list of the records removed from the zone because they are not part
+      of I(records).
+    - Each item is a record dictionary (see above).
+    returned: success, when I(exclusive=true)
+    type: list
+    sample:
+    - name: old
+      type: A
+      ttl: 10800
+      values:
+      - 192.0.2.10
+      zone: my.com
+diagnostics:
+    description:
+    - The API calls made by the module, with their C(method), C(path)
+      (zone, domain and record names replaced by placeholders), C(status),
+      size of the response body in C(bytes), C(duration) in seconds and
+      number of C(retries).
+    - The cumulated time in seconds spent in each phase (C(arguments),
+      C(zone_resolution), C(read), C(write), C(results)), overlapping phases and
+      concurrent writes being counted separately, and the C(elapsed) time.
+    returned: when I(diagnostics=true)
+    type: dict
+    sample:
+      api_calls:
+      - method: GET
+        path: /zones/{zone_id}/records/{name}/{type}
+        status: 200
+        bytes: 96
+        duration: 0.0712
+        retries: 0
+      api_call_count: 1
+      phases:
+        arguments: 0.0031
+        read: 0.0715
+      elapsed: 0.0768
 '''
 
-import json
+import time
 
 from ansible.module_utils.basic import AnsibleModule
-from ansible.module_utils._text import to_native, to_text
-from ansible.module_utils.urls import fetch_url
-
+from ansible.module_utils._text import to_native
+from ansible.module_utils.gandi_livedns_api import (
+    GandiLiveDNSAPI,
+    PushedState,
+    check_record_params,
+    gandi_livedns_record_spec,
+    lowercase_string,
+    parse_zone_file,
+    record_entries,
+)
 
-def lowercase_string(param):
-    if not isinstance(param, str):
-        return param
-    return param.lower()
 
+class GandiAPI(GandiLiveDNSAPI):
 
-class GandiAPI(object):
-
-    api_endpoint = 'https://dns.api.gandi.net/api/v5'
     changed = False
 
-    error_strings = {
-        400: 'Bad request',
-        401: 'Permission denied',
-        404: 'Resource not found',
-    }
-
     def __init__(self, module):
-        self.module = module
-        self.api_key = module.params['api_key']
+        super(GandiAPI, self).__init__(module)
         self.record = lowercase_string(module.params['record'])
         self.state = module.params['state']
         self.ttl = module.params['ttl']
         self.type = module.params['type']
         self.values = module.params['values']
-        self.zone = module.params['zone']
-        self.domain = lowercase_string(module.params['domain'])
-
-    def _gandi_api_call(self, api_call, method='GET', payload=None, error_on_404=True):
-        headers = {'X-Api-Key': self.api_key,
-                   'Content-Type': 'application/json'}
-        data = None
-        if payload:
-            try:
-                data = json.dumps(payload)
-            except Exception as e:
-                self.module.fail_json(msg="Failed to encode payload as JSON: %s " % to_native(e))
-
-        resp, info = fetch_url(self.module,
-                               self.api_endpoint + api_call,
-                               headers=headers,
-                               data=data,
-                               method=method)
-
-        error_msg = ''
-        if info['status'] >= 400 and (info['status'] != 404 or error_on_404):
-            err_s = self.error_strings.get(info['status'], '')
-
-            error_msg = "API error {0}; Status: {1}; Method: {2}: Call: {3}".format(err_s, info['status'], method, api_call)
-
-        result = None
-        try:
-            content = resp.read()
-        except AttributeError:
-            content = None
-
-        if content:
-            try:
-                result = json.loads(to_text(content, errors='surrogate_or_strict'))
-            except (getattr(json, 'JSONDecodeError', ValueError)) as e:
-                error_msg += "; Failed to parse API response with error {0}: {1}".format(to_native(e), content)
-
-        if error_msg:
-            self.module.fail_json(msg=error_msg)
-
-        return result, info['status']
-
-    def build_result(self, result):
-        if result is None:
-            return None
-
-        res = {}
-        for k in ('name', 'type', 'ttl', 'values'):
-            v = result.get('rrset_' + k, None)
-            if v is not None:
-                res[k] = v
-
-        if self.zone:
-            res['zone'] = self.zone
-        else:
-            res['domain'] = self.domain
-
-        return res
-
-    def _get_zone_id(self, zone_name):
-        for z in self.get_zones():
-            if z['name'] == zone_name:
-                return z['uuid']
-        self.module.fail_json(msg="No zone found with name {0}".format(zone_name))
-
-    def get_zones(self):
-        zones, status = self._gandi_api_call('/zones')
-        return zones
-
-    def get_records(self, name, type, zone_id=None, domain=None):
-        if zone_id:
-            url = '/zones/%s' % (zone_id)
-        else:
-            url = '/domains/%s' % (domain)
-
-        url += '/records'
-        if name:
-            url += '/%s' % (name)
-            if type:
-                url += '/%s' % (type)
-
-        records, status = self._gandi_api_call(url, error_on_404=False)
-
-        if status == 404:
-            return None
-
-        if not isinstance(records, list):
-            records = [records]
-
-        # filter by type if name is not set
-        if not name and type:
-            records = [r
-                       for r in records
-                       if r['rrset_type'] == type]
-
-        return records
-
-    def create_record(self, name, type, values, ttl,
-                      zone_id=None, domain=None):
-        if zone_id:
-            url = '/zones/%s' % (zone_id)
-        else:
-            url = '/domains/%s' % (domain)
-
-        url += '/records'
-        new_record = {
-            'rrset_name': name,
-            'rrset_type': type,
-            'rrset_values': values,
-            'rrset_ttl': ttl,
-        }
-        record, status = self._gandi_api_call(
-            url,
-            method='POST',
-            payload=new_record)
-
-        if status in (201,):
-            return new_record
-
-        return None
+        self.records = module.params['records']
+        self.exclusive = module.params['exclusive']
+        self.verify = module.params['verify']
+        self.values_mode = module.params['values_mode']
 
-    def update_record(self, name, type, values, ttl,
-                      zone_id=None, domain=None):
-        if zone_id:
-            url = '/zones/%s' % (zone_id)
-        else:
-            url = '/domains/%s' % (domain)
-
-        url += '/records/%s/%s' % (name, type)
-        new_record = {
-            'rrset_values': values,
-            'rrset_ttl': ttl,
-        }
-        record, status = self._gandi_api_call(
-            url,
-            method='PUT',
-            payload=new_record)
-        return record
-
-    def delete_record(self, name, type, zone_id=None, domain=None):
+    def delete_dns_records(self):
         if self.type is None or self.record is None:
             self.module.fail_json(msg="You must provide a type and a record to delete a record")
 
         if self.values is not None:
             self.module.fail_json(msg="You cannot provide a value when deleting a record")
 
-        if zone_id:
-            url = '/zones/%s' % (zone_id)
-        else:
-            url = '/domains/%s' % (domain)
-        url += '/records/%s/%s' % (name, type)
-
-        record, status = self._gandi_api_call(
-            url,
-            method='DELETE')
-
-    def delete_dns_records(self):
         if self.zone:
             zone_id = self._get_zone_id(self.zone)
         else:
             zone_id = None
 
-        records = self.get_records(self.record, self.type, zone_id=zone_id, domain=self.domain)
+        if self.module.check_mode:
+            records = self.get_records(self.record, self.type, zone_id=zone_id, domain=self.domain,
+                                       cached_misses=True)
+            self.changed = bool(records)
+            return self.changed
 
-        if records:
-            self.changed = True
-            if not self.module.check_mode:
-                result = self.delete_record(self.record, self.type,
-                                            zone_id=zone_id, domain=self.domain)
+        # A missing record is reported as a 404, no need to look it up first
+        self.changed = self.delete_record(self.record, self.type, zone_id=zone_id,
+                                          domain=self.domain, error_on_404=False)
+
+        if self.verify and self.get_records(self.record, self.type,
+                                            zone_id=zone_id, domain=self.domain):
+            self.module.fail_json(msg="Record {0} of type {1} still exists after its deletion".format(
+                self.record, self.type))
 
         return self.changed
 
     def ensure_dns_record(self):
         new_record = {
-            "type": self.type,
-            "name": self.record,
-            "values": self.values,
-            "ttl": self.ttl
+            "rrset_type": self.type,
+            "rrset_name": self.record,
+            "rrset_values": self.values,
+            "rrset_ttl": self.ttl
         }
 
         if self.zone:
@@ -368,28 +617,22 @@ class GandiAPI(object):
         else:
             zone_id = None
 
+        if self.values_mode != 'replace':
+            return self.merge_dns_record(zone_id)
+
         records = self.get_records(self.record, self.type,
                                    zone_id=zone_id, domain=self.domain)
 
         if records:
             record = records[0]
 
-            do_update = False
-            if self.ttl is not None and record['rrset_ttl'] != self.ttl:
-                do_update = True
-            if self.values is not None and set(record['rrset_values']) != set(self.values):
-                do_update = True
-
-            if do_update:
-                if self.module.check_mode:
-                    result = new_record
-                else:
+            if self.record_differs(record, self.values, self.ttl):
+                result = dict(record, rrset_values=self.values, rrset_ttl=self.ttl)
+                if not self.module.check_mode:
                     self.update_record(self.record, self.type, self.values, self.ttl,
                                        zone_id=zone_id, domain=self.domain)
-
-                    records = self.get_records(self.record, self.type,
-                                               zone_id=zone_id, domain=self.domain)
-                    result = records[0]
+                    if self.verify:
+                        result = self.verify_record(zone_id)
                 self.changed = True
                 return result, self.changed
             else:
@@ -400,40 +643,155 @@ class GandiAPI(object):
         else:
             result = self.create_record(self.record, self.type, self.values, self.ttl,
                                         zone_id=zone_id, domain=self.domain)
+            if self.verify:
+                result = self.verify_record(zone_id)
         self.changed = True
         return result, self.changed
 
+    def merge_dns_record(self, zone_id):
+        if self.values_mode == 'append':
+            add, remove = self.values, []
+        else:
+            add, remove = [], self.values
+
+        result, self.changed = self.merge_record(self.record, self.type, self.ttl,
+                                                 add=add, remove=remove,
+                                                 zone_id=zone_id, domain=self.domain)
+        return result, self.changed
+
+    def verify_record(self, zone_id):
+        records = self.get_records(self.record, self.type,
+                                   zone_id=zone_id, domain=self.domain)
+        if not records or self.record_differs(records[0], self.values, self.ttl):
+            self.module.fail_json(msg="Record {0} of type {1} does not match the requested values after its update".format(
+                self.record, self.type))
+        return records[0]
+
+    def ensure_dns_records(self):
+        entries = record_entries(self.module.params)
+        checkpoint = None
+        if self.module.params['checkpoint_file'] and not self.module.check_mode:
+            checkpoint, zone_id = self.open_checkpoint(self.module.params['checkpoint_file'], entries,
+                                                       zone=self.zone, domain=self.domain,
+                                                       exclusive=self.exclusive)
+        elif self.zone:
+            zone_id = self._get_zone_id(self.zone)
+        else:
+            zone_id = None
+
+        try:
+            results, changed, purged = self.reconcile_records(
+                entries, zone_id=zone_id, domain=self.domain, exclusive=self.exclusive,
+                verify=self.verify, checkpoint=checkpoint)
+        except (IOError, OSError) as e:
+            self.module.fail_json(msg="Failed to write checkpoint file {0}: {1}".format(
+                self.module.params['checkpoint_file'], to_native(e)))
+        if changed:
+            self.changed = True
+
+        return results, self.changed, purged
+
+
+def load_zone_file(module):
+    records = []
+    try:
+        with open(module.params['zone_file'], 'rb') as f:
+            zone = module.params['zone'] or module.params['domain'] or ''
+            for rrset in parse_zone_file(f, zone,
+                                         ttl=module.params['ttl']):
+                records.append({
+                    'record': rrset['rrset_name'],
+                    'type': rrset['rrset_type'],
+                    'values': rrset['rrset_values'],
+                    'ttl': rrset['rrset_ttl'],
+                    'state': 'present',
+                })
+    except (IOError, OSError) as e:
+        module.fail_json(msg="Failed to read zone file {0}: {1}".format(
+            module.params['zone_file'], to_native(e)))
+    except ValueError as e:
+        module.fail_json(msg="Failed to parse zone file {0}: {1}".format(
+            module.params['zone_file'], to_native(e)))
+    return records
+
+
+def update_pushed_state(module, gandi_api, pushed):
+    if pushed is None or module.check_mode:
+        return
+    entry = record_entries(module.params)[0]
+    try:
+        pushed.update(pushed.key(gandi_api.api_key, gandi_api.zone, gandi_api.domain, entry),
+                      entry, gandi_api.zone or gandi_api.domain)
+    except (IOError, OSError) as e:
+        module.warn("Failed to update state file {0}: {1}".format(module.params['state_file'], to_native(e)))
+
 
 def main():
+    start = time.time()
+
     module = AnsibleModule(
-        argument_spec=dict(
-            api_key=dict(type='str', required=True, no_log=True),
-            record=dict(type='str', default='@', aliases=['name']),
-            state=dict(type='str', default='present', choices=['absent', 'present']),
-            ttl=dict(type='int', default=10800),
-            type=dict(type='str', choices=['A', 'AAAA', 'ALIAS', 'CAA', 'CDS', 'CNAME', 'DNAME', 'DS', 'KEY', 'LOC', 'MX', 'NS', 'PTR', 'SPF', 'SRV', 'SSHFP', 'TLSA', 'TXT', 'WKS']),
-            values=dict(type='list'),
-            zone=dict(type='str'),
-            domain=dict(type='str'),
-        ),
         supports_check_mode=True,
-        required_if=[
-            ('state', 'present', ['record', 'type', 'values']),
-            ('state', 'absent', ['record', 'type']),
-        ],
+        **gandi_livedns_record_spec()
     )
 
-    if not module.params['zone'] and not module.params['domain']:
-        module.fail_json(msg="At least one of zone and domain parameters need to be defined.")
+    if module.params['zone_file'] is not None:
+        module.params['records'] = load_zone_file(module)
+
+    error = check_record_params(module.params)
+    if error:
+        module.fail_json(msg=error)
 
     gandi_api = GandiAPI(module)
 
-    if gandi_api.state == 'present':
+    if gandi_api.diagnostics:
+        gandi_api.diagnostics.start = start
+        gandi_api.diagnostics.add_phase('arguments', time.time() - start)
+
+    pushed = None
+    if module.params['state_file']:
+        pushed = PushedState(module.params['state_file'], module.params['recheck_interval'])
+        entry = record_entries(module.params)[0]
+        key = pushed.key(gandi_api.api_key, gandi_api.zone, gandi_api.domain, entry)
+        origin = gandi_api.zone or gandi_api.domain
+        if pushed.unchanged(key, entry, origin):
+            # Pushed recently, nothing to do without any API call
+            with gandi_api.phase('results'):
+                result = None
+                if entry['state'] == 'present':
+                    result = {'record': gandi_api.build_result({
+                        'rrset_name': entry['record'],
+                        'rrset_type': entry['type'],
+                        'rrset_values': entry['values'],
+                        'rrset_ttl': entry['ttl'],
+                    })}
+            if result is not None:
+                module.exit_json(changed=False, result=result, **gandi_api.diagnostics_result())
+            module.exit_json(changed=False, **gandi_api.diagnostics_result())
+
+    if gandi_api.records is not None:
+        results, changed, purged = gandi_api.ensure_dns_records()
+        with gandi_api.phase('results'):
+            result = {'records': results}
+            if purged is not None:
+                result['purged'] = purged
+            errors = [r['msg'] for r in results if r.get('failed')]
+        if errors:
+            module.fail_json(msg="Failed to update {0} record(s): {1}".format(len(errors), '; '.join(errors)),
+                             changed=changed, result=result, **gandi_api.diagnostics_result())
+        module.exit_json(changed=changed, result=result, **gandi_api.diagnostics_result())
+    elif gandi_api.state == 'present':
         result, changed = gandi_api.ensure_dns_record()
-        module.exit_json(changed=changed, result={'record': gandi_api.build_result(result)})
+        update_pushed_state(module, gandi_api, pushed)
+        with gandi_api.phase('results'):
+            result = {'record': gandi_api.build_result(result)}
+        module.exit_json(changed=changed, result=result, **gandi_api.diagnostics_result())
     else:
         changed = gandi_api.delete_dns_records()
-        module.exit_json(changed=changed)
+        update_pushed_state(module, gandi_api, pushed)
+        # No result to build, reported for the phases to be the same
+        with gandi_api.phase('results'):
+            pass
+        module.exit_json(changed=changed, **gandi_api.diagnostics_result())
 
 
 if __name__ == '__main__':
@@ -46,10 +46,175 @@ options:
     - The name of the Zone to work with (e.g. "example.com").
     - The Zone must already exist.
     type: str
+  zone_id:
+    description:
+    - The UUID of the I(zone), to use it without looking up the zone name
+      in the list of the zones.
+    - I(zone) is still required, it names the zone in the results.
+    - A wrong UUID is reported as an error, it is not looked up again.
+    - Mutually exclusive with I(domain), I(zones) and I(domains).
+    type: str
   domain:
     description:
     - The name of the Domain to work with (e.g. "example.com").
     type: str
+  zones:
+    description:
+    - A list of Zones to retrieve the records of.
+    - The zones are fetched concurrently (see I(parallelism)) and their
+      records are returned in C(zones), keyed by zone name.
+    - A zone that cannot be retrieved is reported in its entry and does not
+      prevent the other zones from being retrieved.
+    - Mutually exclusive with I(zone), I(domain) and I(zone_file).
+    type: list
+    elements: str
+  domains:
+    description:
+    - A list of Domains to retrieve the records of.
+    - Like I(zones), the records are returned in C(domains), keyed by
+      domain name.
+    - Mutually exclusive with I(zone), I(domain) and I(zone_file).
+    type: list
+    elements: str
+  parallelism:
+    description:
+    - Maximum number of I(zones) and I(domains) fetched concurrently.
+    - The requests share a single pool of persistent connections.
+    type: int
+    default: 8
+  index:
+    description:
+    - Return the records in C(index), a dictionary of the records keyed by
+      name then by type, instead of the C(records) list.
+    - This allows templates to access a record directly, e.g.
+      C(gandi_livedns_facts.index.www.A.values), instead of searching the
+      list.
+    type: bool
+    default: false
+  compact:
+    description:
+    - Leave the C(zone) and C(domain) keys out of the returned records,
+      they are the same for all the records of a zone.
+    type: bool
+    default: false
+  track_changes:
+    description:
+    - Report the changes of the zone or domain since the previous run
+      instead of returning all its records.
+    - The records of each zone are kept as a snapshot in I(cache_dir). With
+      I(zone) or I(zones), the serial of the zone is requested first and
+      the records of a zone whose serial did not change are not downloaded
+      again. The records of a domain are requested with the C(ETag) of the
+      snapshot, they are only not downloaded again if the API answers such
+      conditional requests.
+    - The facts then contain C(unchanged) and a C(changes) dictionary with
+      the C(added), C(removed) and C(modified) records, the latter with
+      their C(previous) TTL and values. On the first run, all the records
+      are reported as added.
+    - The snapshot is updated by each run, except in check mode. Runs
+      sharing a I(cache_dir) should not poll the same zone concurrently,
+      use C(run_once) to poll from several hosts.
+    - I(type) filters the reported changes, C(unchanged) still applies to
+      the whole zone.
+    - Mutually exclusive with I(record) and I(zone_file).
+    type: bool
+    default: false
+  diagnostics:
+    description:
+    - Return C(diagnostics) with the details of the API calls and the time
+      spent in each phase of the module.
+    - Can also be enabled with the C(GANDI_LIVEDNS_DIAGNOSTICS) environment
+      variable.
+    type: bool
+    default: false
+  shared:
+    description:
+    - Handled by the gandi_livedns_facts action plugin.
+    - When enabled, the records of each zone are fetched once per playbook
+      run on the controller and kept in its local temporary directory,
+      instead of being fetched by every host and copied in its facts.
+    - The facts of each host then only contain the C(zone) or C(domain)
+      name and, when I(record) or I(type) is set, the matching records.
+      The whole zone can be read from the shared copy, without any API
+      call, with the gandi_livedns lookup.
+    - The shared copy of a zone is fetched again after a gandi_livedns task
+      of the run changed it.
+    - Ignored when I(zone_file) or I(track_changes) are set.
+    type: bool
+    default: false
+  zone_file:
+    description:
+    - Export the records of the zone or domain as a BIND zone file to this
+      path instead of returning them.
+    - The zone file is streamed to disk as it is received.
+    - Mutually exclusive with I(record) and I(type).
+    type: path
+  cache_dir:
+    description:
+    - Directory where the zone name to zone UUID cache is stored.
+    type: path
+    default: ~/.cache/gandi_livedns
+  zone_cache_ttl:
+    description:
+    - Number of seconds a cached zone UUID is considered valid.
+    - The cache is refreshed when a zone is not found in it or when the API
+      reports the zone of a cached UUID as not found.
+    - C(0) disables the cache.
+    type: int
+    default: 3600
+  negative_cache_ttl:
+    description:
+    - Number of seconds the zone names found missing from the zone list,
+      and the records the API reported as not found, are remembered in
+      I(cache_dir).
+    - Looking them up again within that time fails, or finds no record,
+      without any API call. E.g. repeatedly ensuring that missing records
+      are absent does not call the API again.
+    - Writes through these modules forget the records they modify. Records
+      and zones created by other means are only seen once the entry expires.
+    - C(0) disables the cache.
+    type: int
+    default: 0
+  response_cache:
+    description:
+    - Keep the responses of the API in I(cache_dir) and revalidate them with
+      conditional requests (C(If-None-Match), C(If-Modified-Since)).
+    - An unchanged response is then not downloaded again.
+    - Writes through this module invalidate the cached responses of the
+      records they modify.
+    type: bool
+    default: false
+  validate_certs:
+    description:
+    - Whether to validate the TLS certificate of the API endpoint.
+    type: bool
+    default: true
+  retries:
+    description:
+    - Number of times a request is retried when the API answers with a rate
+      limit (429) or a temporary server error (503, and 500, 502 or 504 for
+      idempotent requests).
+    - Retries use an exponential backoff with jitter and honor the
+      C(Retry-After) header.
+    type: int
+    default: 3
+  rate_limit:
+    description:
+    - Maximum number of requests per second sent to the API, shared by all
+      the processes of the machine using the same API key (e.g. the forks
+      of a playbook run).
+    - The budget is tracked in a file of I(cache_dir).
+    - C(0) disables rate limiting.
+    type: float
+    default: 0
+  use_fetch_url:
+    description:
+    - Send each API request with Ansible's C(fetch_url) instead of reusing a
+      persistent connection.
+    - This opens a new connection for every request but honors the usual
+      C(fetch_url) settings such as proxy environment variables.
+    type: bool
+    default: false
 '''
 
 EXAMPLES = r'''
@@ -70,11 +235,75 @@ EXAMPLES = r'''
     domain: my.com
     record: test
     api_key: dummyapitoken
+
+- name: Get the MX records of several zones at once
+  gandi_livedns_facts:
+    zones:
+    - my.com
+    - my.org
+    domains:
+    - my.net
+    type: MX
+    api_key: dummyapitoken
+
+- name: Get the records of the my.com zone indexed by name and type
+  gandi_livedns_facts:
+    zone: my.com
+    index: true
+    compact: true
+    api_key: dummyapitoken
+
+- name: Show the addresses of www.my.com
+  debug:
+    msg: "{{ gandi_livedns_facts.index.www.A.values }}"
+
+- name: Fetch the my.com zone once for all the hosts, keep their A record
+  gandi_livedns_facts:
+    zone: my.com
+    record: "{{ inventory_hostname_short }}"
+    type: A
+    shared: true
+    api_key: dummyapitoken
+
+- name: Read any record of the shared copy of the zone
+  debug:
+    msg: "{{ lookup('gandi_livedns', 'www', zone='my.com', type='A', api_key=dummyapitoken) }}"
+
+- name: Report the changes of the my.com zone since the last poll
+  gandi_livedns_facts:
+    zone: my.com
+    track_changes: true
+    api_key: dummyapitoken
+  run_once: true
+
+- name: Show the modified records
+  debug:
+    msg: "{{ gandi_livedns_facts.changes.modified }}"
+  when: not gandi_livedns_facts.unchanged
+
+- name: Export the my.com zone to a BIND zone file
+  gandi_livedns_facts:
+    zone: my.com
+    zone_file: /srv/dns/my.com.zone
+    api_key: dummyapitoken
 '''
 
 RETURN = r'''
 gandi_livedns_facts:
-    description: A list containing the records data.
+    description:
+    - A dictionary with a C(records) list containing the records data.
+    - When I(index) is set, it contains an C(index) dictionary of the
+      records keyed by name and type instead of the C(records) list.
+    - When I(zone_file) is set, it only contains the C(zone_file) path.
+    - When I(track_changes) is set, it contains C(unchanged) and the
+      C(changes) dictionary instead of the records.
+    - When I(shared) is set, it also contains the C(zone) or C(domain)
+      name and only contains the records when I(record) or I(type) is set.
+    - When I(zones) or I(domains) are set, it contains C(zones) and
+      C(domains) dictionaries keyed by name. Each entry has a C(records)
+      list or an C(index) dictionary (C(unchanged) and C(changes) with
+      I(track_changes)), or C(failed) and the error in C(msg) if it could not be
+      retrieved.
     returned: success, except on invalid parameters
     type: complex
     contains:
@@ -110,169 +339,237 @@ gandi_livedns_facts:
             returned: success
             type: str
             sample: my.com
+diagnostics:
+    description:
+    - The API calls made by the module, with their C(method), C(path)
+      (zone, domain and record names replaced by placeholders), C(status),
+      size of the response body in C(bytes), C(duration) in seconds and
+      number of C(retries).
+    - The cumulated time in seconds spent in each phase (C(arguments),
+      C(zone_resolution), C(read), C(results)), overlapping phases and
+      concurrent reads being counted separately, and the C(elapsed) time.
+    returned: when I(diagnostics=true)
+    type: dict
+    sample:
+      api_calls:
+      - method: GET
+        path: /zones/{zone_id}/records
+        status: 200
+        bytes: 1841
+        duration: 0.0914
+        retries: 0
+      api_call_count: 1
+      phases:
+        arguments: 0.0029
+        read: 0.0921
+        results: 0.0001
+      elapsed: 0.0958
 '''
 
-import json
-
-from ansible.module_utils.basic import AnsibleModule
-from ansible.module_utils._text import to_native, to_text
-from ansible.module_utils.urls import fetch_url
+import os
+import tempfile
+import time
 
+from functools import partial
 
-def lowercase_string(param):
-    if not isinstance(param, str):
-        return param
-    return param.lower()
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.gandi_livedns_api import (
+    GandiLiveDNSAPI,
+    ZoneSnapshots,
+    gandi_livedns_facts_spec,
+    lowercase_string,
+    rrsets_delta,
+)
 
 
-class GandiAPI(object):
+class GandiAPI(GandiLiveDNSAPI):
 
-    api_endpoint = 'https://dns.api.gandi.net/api/v5'
     changed = False
 
-    error_strings = {
-        401: 'Permission denied',
-        404: 'Resource not found',
-    }
-
     def __init__(self, module):
-        self.module = module
-        self.api_key = module.params['api_key']
+        super(GandiAPI, self).__init__(module)
         self.record = lowercase_string(module.params['record'])
         self.type = module.params['type']
-        self.zone = module.params['zone']
-        self.domain = lowercase_string(module.params['domain'])
-
-    def _gandi_api_call(self, api_call, method='GET', payload=None, error_on_404=True):
-        headers = {'X-Api-Key': self.api_key,
-                   'Content-Type': 'application/json'}
-        data = None
-        if payload:
-            try:
-                data = json.dumps(payload)
-            except Exception as e:
-                self.module.fail_json(msg="Failed to encode payload as JSON: %s " % to_native(e))
-
-        resp, info = fetch_url(self.module,
-                               self.api_endpoint + api_call,
-                               headers=headers,
-                               data=data,
-                               method=method)
-
-        error_msg = ''
-        if info['status'] >= 400:
-            err_s = self.error_strings.get(info['status'], '')
-
-            error_msg = "API error {0}; Status: {1}; Method: {2}: Call: {3}".format(err_s, info['status'], method, api_call)
-
-        result = None
-        try:
-            content = resp.read()
-        except AttributeError:
-            content = None
-
-        if content:
-            try:
-                result = json.loads(to_text(content, errors='surrogate_or_strict'))
-            except (getattr(json, 'JSONDecodeError', ValueError)) as e:
-                error_msg += "; Failed to parse API response with error {0}: {1}".format(to_native(e), content)
-
-        if error_msg:
-            self.module.fail_json(msg=error_msg)
-
-        return result, info['status']
-
-    def build_results(self, results):
-        ret = []
+        self.index = module.params['index']
+        self.compact = module.params['compact']
+        self.snapshots = None
+        if module.params['track_changes']:
+            self.snapshots = ZoneSnapshots(self.api_key, module.params['cache_dir'])
+
+    def build_record(self, res, zone=None, domain=None):
+        d = {}
+        for k in ('name', 'type', 'ttl', 'values'):
+            v = res.get('rrset_' + k, None)
+            if v is not None:
+                d[k] = v
+        if not self.compact:
+            if zone:
+                d['zone'] = zone
+            else:
+                d['domain'] = domain
+        return d
 
+    def build_results(self, results, zone=None, domain=None):
         if results is None:
             return None
 
-        for res in results:
-            d = {}
-            for k in ('name', 'type', 'ttl', 'values'):
-                v = res.get('rrset_' + k, None)
-                if v is not None:
-                    d[k] = v
-            if self.zone:
-                d['zone'] = self.zone
-            else:
-                d['domain'] = self.domain
-            ret.append(d)
+        if zone is None and domain is None:
+            zone = self.zone
+            domain = self.domain
 
-        return ret
+        return [self.build_record(res, zone=zone, domain=domain) for res in results]
 
-    def _get_zone_id(self, zone_name):
-        for z in self.get_zones():
-            if z['name'] == zone_name:
-                return z['uuid']
-        self.module.fail_json(msg="No zone found with name {0}".format(zone_name))
+    def format_results(self, records):
+        with self.phase('results'):
+            return self._format_results(records)
 
-    def get_zones(self):
-        zones, status = self._gandi_api_call('/zones')
-        return zones
+    def _format_results(self, records):
+        if not self.index:
+            return {'records': records}
 
-    def get_records(self, name, type, zone_id=None, domain=None):
-        if zone_id:
-            url = '/zones/%s' % (zone_id)
-        else:
-            url = '/domains/%s' % (domain)
+        index = {}
+        for r in records or []:
+            index.setdefault(r['name'], {})[r['type']] = r
+        return {'index': index}
 
-        url += '/records'
-        if name:
-            url += '/%s' % (name)
-            if type:
-                url += '/%s' % (type)
-
-        records, status = self._gandi_api_call(url, error_on_404=False)
-
-        if status == 404:
-            return None
+    def get_dns_records(self, **kwargs):
+        return self.get_zone_records(zone=self.zone, domain=self.domain)
 
-        if not isinstance(records, list):
-            records = [records]
+    def get_zone_records(self, zone=None, domain=None):
+        if zone:
+            zone_id = self._get_zone_id(zone)
+        else:
+            zone_id = None
 
-        # filter by type if name is not set
-        if not name and type:
-            records = [r
-                       for r in records
-                       if r['rrset_type'] == type]
+        # The records are built as they are received, without keeping the
+        # API response around
+        return self.get_records(self.record, self.type, zone_id=zone_id, domain=domain,
+                                build=partial(self.build_record, zone=zone, domain=domain),
+                                cached_misses=True)
 
-        return records
+    def get_dns_changes(self, zone=None, domain=None):
+        if zone:
+            zone_id = self._get_zone_id(zone)
+            key = 'zones/' + zone
+        else:
+            zone_id = None
+            key = 'domains/' + domain
+
+        # The snapshot is kept untouched in check mode, the changes are
+        # reported again on the next run
+        records, previous, unchanged = self.get_zone_changes(
+            self.snapshots, key, zone_id=zone_id, domain=domain,
+            save=not self.module.check_mode)
+        if records is None:
+            self.fail("Domain {0} not found".format(zone or domain))
+
+        with self.phase('results'):
+            return self.build_changes(previous, records, unchanged, zone=zone, domain=domain)
+
+    def build_changes(self, previous, records, unchanged, zone=None, domain=None):
+        added, removed, modified = rrsets_delta(previous or [], records)
+        if self.type:
+            added = [r for r in added if r['rrset_type'] == self.type]
+            removed = [r for r in removed if r['rrset_type'] == self.type]
+            modified = [(old, new) for old, new in modified if new['rrset_type'] == self.type]
+
+        build = partial(self.build_record, zone=zone, domain=domain)
+        changes = {
+            'added': [build(r) for r in added],
+            'removed': [build(r) for r in removed],
+            'modified': [],
+        }
+        for old, new in modified:
+            record = build(new)
+            record['previous'] = {'ttl': old.get('rrset_ttl'), 'values': old.get('rrset_values')}
+            changes['modified'].append(record)
+
+        return {'unchanged': unchanged, 'changes': changes}
+
+    def get_many_dns_records(self, zones, domains):
+        names = [('zones', z) for z in zones or []]
+        names += [('domains', lowercase_string(d)) for d in domains or []]
+
+        get = self.get_dns_changes if self.snapshots else self.get_zone_records
+        tasks = []
+        for kind, name in names:
+            if kind == 'zones':
+                tasks.append(partial(get, zone=name))
+            else:
+                tasks.append(partial(get, domain=name))
+
+        facts = {'zones': {}, 'domains': {}}
+        for (kind, name), (records, error) in zip(names, self.run_parallel(tasks)):
+            if error:
+                facts[kind][name] = {'failed': True, 'msg': error}
+                self.module.warn("Failed to retrieve the records of {0}: {1}".format(name, error))
+            elif self.snapshots:
+                facts[kind][name] = records
+            else:
+                facts[kind][name] = self.format_results(records)
 
-    def get_dns_records(self, **kwargs):
+        return facts
 
+    def export_dns_records(self, path):
         if self.zone:
             zone_id = self._get_zone_id(self.zone)
         else:
             zone_id = None
 
-        record = self.get_records(self.record, self.type, zone_id=zone_id, domain=self.domain)
+        fd, tmp = tempfile.mkstemp(dir=self.module.tmpdir)
+        with os.fdopen(fd, 'wb') as f:
+            self.export_zone_file(f, zone_id=zone_id, domain=self.domain)
+
+        if os.path.exists(path) and self.module.sha1(tmp) == self.module.sha1(path):
+            os.unlink(tmp)
+        elif self.module.check_mode:
+            self.changed = True
+            os.unlink(tmp)
+        else:
+            self.changed = True
+            self.module.atomic_move(tmp, path)
 
-        return record
+        return self.changed
 
 def main():
+    start = time.time()
+
     module = AnsibleModule(
-        argument_spec=dict(
-            api_key=dict(type='str', required=True, no_log=True),
-            record=dict(type='str', aliases=['name']),
-            type=dict(type='str', choices=['A', 'AAAA', 'ALIAS', 'CAA', 'CDS', 'CNAME', 'DNAME', 'DS', 'KEY', 'LOC', 'MX', 'NS', 'PTR', 'SPF', 'SRV', 'SSHFP', 'TLSA', 'TXT', 'WKS']),
-            zone=dict(type='str'),
-            domain=dict(type='str'),
-        ),
         supports_check_mode=True,
+        **gandi_livedns_facts_spec()
     )
 
-    if not module.params['zone'] and not module.params['domain']:
-        module.fail_json(msg="At least one of zone and domain parameters need to be defined.")
+    if not module.params['zone'] and not module.params['domain'] and \
+            module.params['zones'] is None and module.params['domains'] is None:
+        module.fail_json(msg="At least one of zone, domain, zones and domains parameters need to be defined.")
 
     gandi_api = GandiAPI(module)
 
-    results = gandi_api.get_dns_records()
-
-    facts = {'records': gandi_api.build_results(results)}
-
-    module.exit_json(changed=False, ansible_facts={'gandi_livedns_facts': facts})
+    if gandi_api.diagnostics:
+        gandi_api.diagnostics.start = start
+        gandi_api.diagnostics.add_phase('arguments', time.time() - start)
+
+    if module.params['zones'] is not None or module.params['domains'] is not None:
+        facts = gandi_api.get_many_dns_records(module.params['zones'], module.params['domains'])
+        module.exit_json(changed=False, ansible_facts={'gandi_livedns_facts': facts},
+                         **gandi_api.diagnostics_result())
+
+    if module.params['zone_file']:
+        changed = gandi_api.export_dns_records(module.params['zone_file'])
+        with gandi_api.phase('results'):
+            facts = {'zone_file': module.params['zone_file']}
+        module.exit_json(changed=changed, ansible_facts={'gandi_livedns_facts': facts},
+                         **gandi_api.diagnostics_result())
+
+    if gandi_api.snapshots:
+        facts = gandi_api.get_dns_changes(zone=gandi_api.zone, domain=gandi_api.domain)
+        module.exit_json(changed=False, ansible_facts={'gandi_livedns_facts': facts},
+                         **gandi_api.diagnostics_result())
+
+    records = gandi_api.get_dns_records()
+    facts = gandi_api.format_results(records)
+    module.exit_json(changed=False, ansible_facts={'gandi_livedns_facts': facts},
+                     **gandi_api.diagnostics_result())
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2019 Gregory Thiemonge <gregory.thiemonge@gmail.com>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+
+__metaclass__ = type
+
+DOCUMENTATION = r'''
+name: gandi_livedns
+author:
+- Gregory Thiemonge <gregory.thiemonge@gmail.com>
+version_added: "1.0"
+short_description: Retrieve Gandi LiveDNS records
+description:
+- Returns the values of the records of a zone or domain managed by the
+  Gandi LiveDNS API, see the docs U(https://doc.livedns.gandi.net/).
+- The records of a zone are fetched once and kept in memory, so that many
+  lookups on the same zone only cost a single API call. The fetched zones
+  are also shared by all the workers of the playbook run through its local
+  temporary directory, a zone is fetched again after a gandi_livedns task
+  of the run changed it.
+options:
+  _terms:
+    description:
+    - Names of the records to retrieve, C(@) for the zone apex.
+    required: true
+  api_key:
+    description:
+    - Account API token.
+    type: str
+    required: true
+  zone:
+    description:
+    - The name of the Zone to work with (e.g. "example.com").
+    type: str
+  zone_id:
+    description:
+    - The UUID of the I(zone), used without looking up the zone name.
+    type: str
+  domain:
+    description:
+    - The name of the Domain to work with (e.g. "example.com").
+    type: str
+  type:
+    description:
+    - The type of DNS records to retrieve.
+    - Absence of type retrieves all type of records.
+    type: str
+  details:
+    description:
+    - Return the record dictionaries (name, type, ttl, values) instead of
+      the record values.
+    type: bool
+    default: false
+  cache_size:
+    description:
+    - Maximum number of zones kept in memory, the least recently used zone
+      is evicted first.
+    type: int
+    default: 16
+  cache_dir:
+    description:
+    - Directory where the zone name to zone UUID cache is stored.
+    type: path
+    default: ~/.cache/gandi_livedns
+  zone_cache_ttl:
+    description:
+    - Number of seconds a cached zone UUID is considered valid.
+    - C(0) disables the cache.
+    type: int
+    default: 3600
+  validate_certs:
+    description:
+    - Whether to validate the TLS certificate of the API endpoint.
+    type: bool
+    default: true
+  retries:
+    description:
+    - Number of times a request is retried when the API answers with a rate
+      limit (429) or a temporary server error (503, and 500, 502 or 504 for
+      idempotent requests).
+    - Retries use an exponential backoff with jitter and honor the
+      C(Retry-After) header.
+    type: int
+    default: 3
+  rate_limit:
+    description:
+    - Maximum number of requests per second sent to the API, shared by all
+      the processes of the machine using the same API key (e.g. the forks
+      of a playbook run).
+    - The budget is tracked in a file of I(cache_dir).
+    - C(0) disables rate limiting.
+    type: float
+    default: 0
+'''
+
+EXAMPLES = r'''
+- name: Show the addresses of www.my.com
+  debug:
+    msg: "{{ lookup('gandi_livedns', 'www', zone='my.com', type='A', api_key=gandi_api_key) }}"
+
+- name: Get the MX records of the my.com domain with their TTL
+  debug:
+    msg: "{{ query('gandi_livedns', '@', domain='my.com', type='MX', details=true, api_key=gandi_api_key) }}"
+'''
+
+RETURN = r'''
+_raw:
+  description:
+  - The values of the matching records.
+  - With I(details=true), the matching record dictionaries.
+  type: list
+'''
+
+import os
+import sys
+
+from ansible import constants as C
+from ansible.errors import AnsibleError
+from ansible.module_utils._text import to_native
+from ansible.plugins.lookup import LookupBase
+
+try:
+    from collections import OrderedDict
+except ImportError:
+    from ansible.module_utils.compat.ordereddict import OrderedDict
+
+
+def _load_module_utils():
+    # Copy of _load_module_utils() in action_plugins/gandi_livedns.py
+    name = 'ansible.module_utils.gandi_livedns_api'
+    if name not in sys.modules:
+        import importlib.util
+        path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                            'module_utils', 'gandi_livedns_api.py')
+        spec = importlib.util.spec_from_file_location(name, path)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[name] = module
+        spec.loader.exec_module(module)
+    return sys.modules[name]
+
+
+try:
+    from ansible.module_utils import gandi_livedns_api
+except ImportError:
+    gandi_livedns_api = _load_module_utils()
+
+
+# Version of the shared copy and records of the fetched zones, in least
+# recently used order
+_zones = OrderedDict()
+
+
+class LookupModule(LookupBase):
+
+    def run(self, terms, variables=None, **kwargs):
+        self.set_options(var_options=variables, direct=kwargs)
+
+        params = dict((k, self.get_option(k))
+                      for k in ('api_key', 'zone', 'zone_id', 'domain', 'cache_dir',
+                                'zone_cache_ttl', 'validate_certs', 'retries',
+                                'rate_limit'))
+        if not params['zone'] and not params['domain']:
+            raise AnsibleError("At least one of zone and domain parameters need to be defined.")
+
+        records = self._get_zone_records(params)
+
+        type = self.get_option('type')
+        details = self.get_option('details')
+
+        ret = []
+        for term in terms:
+            name = gandi_livedns_api.lowercase_string(term)
+            for record in records:
+                if record['name'] != name or (type and record['type'] != type):
+                    continue
+                if details:
+                    ret.append(record)
+                else:
+                    ret.extend(record['values'])
+        return ret
+
+    def _get_zone_records(self, params):
+        key = gandi_livedns_api.shared_records_key(params)
+
+        # The shared copy is dropped when a gandi_livedns task changes the zone
+        version = gandi_livedns_api.shared_records_version(C.DEFAULT_LOCAL_TMP, params)
+        if key in _zones and version is not None and _zones[key][0] == version:
+            records = _zones.pop(key)[1]
+        else:
+            # The zone may have already been fetched by another worker
+            try:
+                records = gandi_livedns_api.shared_zone_records(C.DEFAULT_LOCAL_TMP, params)
+            except gandi_livedns_api.GandiLiveDNSError as e:
+                raise AnsibleError(to_native(e))
+            version = gandi_livedns_api.shared_records_version(C.DEFAULT_LOCAL_TMP, params)
+
+        _zones[key] = (version, records)
+        while len(_zones) > max(self.get_option('cache_size'), 1):
+            _zones.popitem(last=False)
+
+        return records
@@ -0,0 +1,2505 @@
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2019 Gregory Thiemonge <gregory.thiemonge@gmail.com>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+
+__metaclass__ = type
+
+import fcntl
+import hashlib
+import json
+import os
+import random
+import re
+import shutil
+import socket
+import ssl
+import tempfile
+import threading
+import time
+import zlib
+
+from codecs import getincrementaldecoder
+from contextlib import contextmanager
+from email.utils import mktime_tz, parsedate_tz
+from functools import partial, wraps
+
+from ansible.module_utils._text import to_bytes, to_native, to_text
+try:
+    from ansible.module_utils.common.parameters import env_fallback
+except ImportError:
+    from ansible.module_utils.basic import env_fallback
+from ansible.module_utils.six.moves import http_client, queue
+from ansible.module_utils.six.moves.urllib.parse import urlparse
+
+# Size of the chunks used when streaming a response body to a file
+CHUNK_SIZE = 64 * 1024
+
+# Rate limited and temporary server errors, retried with backoff
+RETRY_STATUSES = (429, 502, 503, 504)
+
+# The errors retried for requests that cannot be repeated (POST), the
+# other ones may come after the request was applied
+RETRY_UNAPPLIED_STATUSES = (429, 503)
+RETRY_BASE_DELAY = 1
+RETRY_MAX_DELAY = 60
+
+# Longest wait for the writes of concurrent clients before a merged rrset
+# is read back
+MERGE_SETTLE_MAX_DELAY = 2
+
+
+def gandi_livedns_argument_spec():
+    return dict(
+        api_key=dict(type='str', required=True, no_log=True),
+        zone=dict(type='str'),
+        zone_id=dict(type='str'),
+        domain=dict(type='str'),
+        cache_dir=dict(type='path', default='~/.cache/gandi_livedns'),
+        zone_cache_ttl=dict(type='int', default=3600),
+        negative_cache_ttl=dict(type='int', default=0),
+        response_cache=dict(type='bool', default=False),
+        retries=dict(type='int', default=3),
+        rate_limit=dict(type='float', default=0),
+        validate_certs=dict(type='bool', default=True),
+        use_fetch_url=dict(type='bool', default=False),
+        diagnostics=dict(type='bool', default=False,
+                         fallback=(env_fallback, ['GANDI_LIVEDNS_DIAGNOSTICS'])),
+    )
+
+
+VALUES_MODES = ['append', 'remove', 'replace']
+
+RECORD_TYPES = ['A', 'AAAA', 'ALIAS', 'CAA', 'CDS', 'CNAME', 'DNAME', 'DS', 'KEY', 'LOC', 'MX', 'NS', 'PTR', 'SPF', 'SRV', 'SSHFP', 'TLSA', 'TXT', 'WKS']
+
+
+def gandi_livedns_record_spec():
+    """Return the AnsibleModule arguments of the gandi_livedns module.
+
+    They are also used by the gandi_livedns action plugin to validate the
+    parameters on the controller.
+    """
+    argument_spec = gandi_livedns_argument_spec()
+    argument_spec.update(
+        record=dict(type='str', default='@', aliases=['name']),
+        state=dict(type='str', default='present', choices=['absent', 'present']),
+        ttl=dict(type='int', default=10800),
+        type=dict(type='str', choices=RECORD_TYPES),
+        values=dict(type='list'),
+        values_mode=dict(type='str', default='replace', choices=VALUES_MODES),
+        records=dict(type='list', elements='dict', options=dict(
+            record=dict(type='str', default='@', aliases=['name']),
+            type=dict(type='str', required=True, choices=RECORD_TYPES),
+            values=dict(type='list', aliases=['content']),
+            ttl=dict(type='int'),
+            state=dict(type='str', choices=['absent', 'present']),
+            values_mode=dict(type='str', choices=VALUES_MODES),
+        )),
+        zone_file=dict(type='path'),
+        exclusive=dict(type='bool', default=False),
+        parallelism=dict(type='int', default=1),
+        verify=dict(type='bool', default=False),
+        state_file=dict(type='path'),
+        recheck_interval=dict(type='int', default=3600),
+        checkpoint_file=dict(type='path'),
+    )
+
+    return dict(
+        argument_spec=argument_spec,
+        mutually_exclusive=[
+            ('records', 'type'),
+            ('records', 'values'),
+            ('records', 'zone_file'),
+            ('zone_file', 'type'),
+            ('zone_file', 'values'),
+            ('state_file', 'records'),
+            ('state_file', 'zone_file'),
+            ('zone_id', 'domain'),
+        ],
+        required_one_of=[
+            ('records', 'type', 'zone_file'),
+        ],
+        required_if=[
+            ('exclusive', True, ['records', 'zone_file'], True),
+        ],
+        required_by={
+            'zone_id': 'zone',
+        },
+    )
+
+
+def gandi_livedns_facts_spec():
+    """Return the AnsibleModule arguments of the gandi_livedns_facts module.
+
+    They are also used by the gandi_livedns_facts action plugin to validate
+    the parameters on the controller.
+    """
+    argument_spec = gandi_livedns_argument_spec()
+    argument_spec.update(
+        record=dict(type='str', aliases=['name']),
+        type=dict(type='str', choices=RECORD_TYPES),
+        zone_file=dict(type='path'),
+        zones=dict(type='list', elements='str'),
+        domains=dict(type='list', elements='str'),
+        parallelism=dict(type='int', default=8),
+        index=dict(type='bool', default=False),
+        compact=dict(type='bool', default=False),
+        track_changes=dict(type='bool', default=False),
+    )
+
+    return dict(
+        argument_spec=argument_spec,
+        mutually_exclusive=[
+            ('zone_file', 'record'),
+            ('zone_file', 'type'),
+            ('zones', 'zone'),
+            ('zones', 'domain'),
+            ('zones', 'zone_file'),
+            ('domains', 'zone'),
+            ('domains', 'domain'),
+            ('domains', 'zone_file'),
+            ('track_changes', 'record'),
+            ('track_changes', 'zone_file'),
+            ('zone_id', 'domain'),
+            ('zone_id', 'zones'),
+            ('zone_id', 'domains'),
+        ],
+        required_by={
+            'zone_id': 'zone',
+        },
+    )
+
+
+def check_record_params(params):
+    """Return an error message if the gandi_livedns parameters are invalid.
+
+    The records are validated locally, before any API call, and all their
+    errors are reported at once.
+    """
+    if not params['zone'] and not params['domain']:
+        return "At least one of zone and domain parameters need to be defined."
+
+    errors = []
+    if params['records'] is not None:
+        for entry in params['records']:
+            state = entry['state'] or params['state']
+            values_mode = entry.get('values_mode') or params.get('values_mode')
+            if state == 'present' and entry['values'] is None:
+                errors.append("Missing values for record {0} of type {1}".format(entry['record'], entry['type']))
+            if state == 'absent' and entry['values'] is not None:
+                errors.append("You cannot provide a value when deleting record {0} of type {1}".format(entry['record'], entry['type']))
+            if state == 'absent' and values_mode not in (None, 'replace'):
+                errors.append("values_mode {0} cannot be used to delete record {1} of type {2}".format(
+                    values_mode, entry['record'], entry['type']))
+    elif params['state'] == 'present' and params['values'] is None:
+        return "state is present but all of the following are missing: values"
+    elif params['state'] == 'absent' and params.get('values_mode') not in (None, 'replace'):
+        return "values_mode {0} cannot be used with state absent".format(params['values_mode'])
+
+    if params.get('checkpoint_file') and params['records'] is None:
+        return "checkpoint_file requires records or zone_file"
+
+    if not errors:
+        errors = validate_records(record_entries(params))
+
+    if errors:
+        return '; '.join(errors)
+    return None
+
+
+# TTL bounds accepted by LiveDNS
+MIN_TTL = 300
+MAX_TTL = 2592000
+
+_HOSTNAME_RE = re.compile(r'^(\*|@|[a-z0-9_]([a-z0-9_-]*[a-z0-9_])?)'
+                          r'(\.[a-z0-9_]([a-z0-9_-]*[a-z0-9_])?)*\.?$', re.I)
+_HEX_RE = re.compile(r'^[0-9a-f]+$', re.I)
+_BASE64_RE = re.compile(r'^[a-z0-9+/]+=*$', re.I)
+_CAA_TAG_RE = re.compile(r'^[a-z0-9]+$', re.I)
+_LOC_RE = re.compile(r'^\d+( \d+( \d+(\.\d+)?)?)? [NS] \d+( \d+( \d+(\.\d+)?)?)? [EW] '
+                     r'-?\d+(\.\d+)?m?( \d+(\.\d+)?m?){0,3}$', re.I)
+
+
+def _is_int(value, maximum):
+    return value.isdigit() and int(value) <= maximum
+
+
+def _is_address(family, value):
+    try:
+        socket.inet_pton(family, value)
+    except (socket.error, ValueError):
+        return False
+    return True
+
+
+def _is_hostname(value):
+    return (len(value.rstrip('.')) <= 253 and _HOSTNAME_RE.match(value) is not None and
+            all(len(label) <= 63 for label in value.rstrip('.').split('.')))
+
+
+def _check_fields(fields, checks):
+    if len(fields) != len(checks):
+        return "expected {0} fields, got {1}".format(len(checks), len(fields))
+    for field, (description, check) in zip(fields, checks):
+        if not check(field):
+            return "invalid {0} {1}".format(description, field)
+    return None
+
+
+def _is_uint8(value):
+    return _is_int(value, 255)
+
+
+def _is_uint16(value):
+    return _is_int(value, 65535)
+
+
+def _is_hex(value):
+    return _HEX_RE.match(value) is not None
+
+
+def _check_value(type, value):
+    """Return an error message if value is not valid for the record type."""
+    fields = value.split()
+    if not fields:
+        return "empty value"
+
+    if type == 'A':
+        if not _is_address(socket.AF_INET, value.strip()):
+            return "invalid IPv4 address {0}".format(value)
+    elif type == 'AAAA':
+        if not _is_address(socket.AF_INET6, value.strip()):
+            return "invalid IPv6 address {0}".format(value)
+    elif type in ('ALIAS', 'CNAME', 'DNAME', 'NS', 'PTR'):
+        return _check_fields(fields, [('domain name', _is_hostname)])
+    elif type == 'MX':
+        return _check_fields(fields, [('priority', _is_uint16),
+                                      ('mail server', lambda f: f == '.' or _is_hostname(f))])
+    elif type == 'SRV':
+        return _check_fields(fields, [('priority', _is_uint16),
+                                      ('weight', _is_uint16),
+                                      ('port', _is_uint16),
+                                      ('target', lambda f: f == '.' or _is_hostname(f))])
+    elif type == 'CAA':
+        if len(fields) < 3:
+            return "expected flags, tag and value"
+        return _check_fields(fields[:2], [('flags', _is_uint8),
+                                          ('tag', lambda f: _CAA_TAG_RE.match(f) is not None)])
+    elif type in ('CDS', 'DS'):
+        if len(fields) < 4:
+            return "expected key tag, algorithm, digest type and digest"
+        return _check_fields(fields[:3] + [''.join(fields[3:])],
+                             [('key tag', _is_uint16), ('algorithm', _is_uint8),
+                              ('digest type', _is_uint8), ('digest', _is_hex)])
+    elif type == 'SSHFP':
+        if len(fields) < 3:
+            return "expected algorithm, fingerprint type and fingerprint"
+        return _check_fields(fields[:2] + [''.join(fields[2:])],
+                             [('algorithm', _is_uint8), ('fingerprint type', _is_uint8),
+                              ('fingerprint', _is_hex)])
+    elif type == 'TLSA':
+        if len(fields) < 4:
+            return "expected usage, selector, matching type and certificate data"
+        return _check_fields(fields[:3] + [''.join(fields[3:])],
+                             [('usage', _is_uint8), ('selector', _is_uint8),
+                              ('matching type', _is_uint8), ('certificate data', _is_hex)])
+    elif type == 'KEY':
+        if len(fields) < 4:
+            return "expected flags, protocol, algorithm and public key"
+        return _check_fields(fields[:3] + [''.join(fields[3:])],
+                             [('flags', _is_uint16), ('protocol', _is_uint8),
+                              ('algorithm', _is_uint8),
+                              ('public key', lambda f: _BASE64_RE.match(f) is not None)])
+    elif type == 'LOC':
+        if not _LOC_RE.match(' '.join(fields)):
+            return "invalid location {0}".format(value)
+    elif type == 'WKS':
+        if len(fields) < 2:
+            return "expected address, protocol and services"
+        if not _is_address(socket.AF_INET, fields[0]):
+            return "invalid IPv4 address {0}".format(fields[0])
+    elif type in ('SPF', 'TXT'):
+        if re.sub(r'\\.', '', value).count('"') % 2:
+            return "unbalanced quotes in {0}".format(value)
+    return None
+
+
+def validate_records(entries):
+    """Validate record entries as returned by record_entries().
+
+    Return the list of all the errors found, without any API call.
+    """
+    errors = []
+    types = {}
+    for entry in entries:
+        name = entry['record']
+        type = entry['type']
+        prefix = "Record {0} of type {1}".format(name, type)
+
+        if entry['state'] != 'present':
+            continue
+        types.setdefault(name, set()).add(type)
+
+        if entry['ttl'] is not None and not MIN_TTL <= entry['ttl'] <= MAX_TTL:
+            errors.append("{0}: TTL {1} is not between {2} and {3}".format(
+                prefix, entry['ttl'], MIN_TTL, MAX_TTL))
+        if not entry['values']:
+            errors.append("{0}: no values".format(prefix))
+            continue
+        if type == 'CNAME' and len(entry['values']) > 1:
+            errors.append("{0}: a CNAME record cannot have several values".format(prefix))
+        for value in entry['values']:
+            error = _check_value(type, to_text(value))
+            if error:
+                errors.append("{0}: {1}".format(prefix, error))
+
+    for name in sorted(types, key=to_text):
+        if 'CNAME' in types[name] and len(types[name]) > 1:
+            errors.append("Record {0}: a CNAME record cannot coexist with records of type {1}".format(
+                name, ', '.join(sorted(types[name] - set(['CNAME'])))))
+
+    return errors
+
+
+def lowercase_string(param):
+    if not isinstance(param, str):
+        return param
+    return param.lower()
+
+
+def record_entries(params):
+    """Return the records described by the parameters of gandi_livedns.
+
+    Each record is a dict with record, type, values, ttl, state and
+    values_mode keys, the defaults of the entries of the records list are
+    resolved from the top-level ttl, state and values_mode parameters.
+    """
+    if params.get('records') is None:
+        entries = [params]
+    else:
+        entries = params['records']
+
+    records = []
+    for entry in entries:
+        records.append({
+            'record': lowercase_string(entry['record']),
+            'type': entry['type'],
+            'values': entry['values'],
+            'ttl': entry['ttl'] if entry['ttl'] is not None else params['ttl'],
+            'state': entry['state'] or params['state'],
+            'values_mode': entry.get('values_mode') or params.get('values_mode') or 'replace',
+        })
+    return records
+
+
+def api_key_hash(api_key):
+    return hashlib.sha256(to_bytes(api_key, errors='surrogate_or_strict')).hexdigest()[:16]
+
+
+def write_json_file(path, data):
+    dirname = os.path.dirname(path)
+    if not os.path.isdir(dirname):
+        os.makedirs(dirname, 0o700)
+
+    fd, tmp = tempfile.mkstemp(dir=dirname, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f)
+        os.rename(tmp, path)
+    except Exception:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+
+def read_json_file(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return None
+
+
+class ZoneCache(object):
+    """On-disk index of zone names to zone UUIDs.
+
+    One cache file is kept per API key (identified by a hash of the key).
+    A ttl of 0 disables the cache.
+    """
+
+    def __init__(self, api_key, cache_dir, ttl):
+        self.ttl = ttl
+        self.path = None
+        self.index = {}
+        self.timestamp = 0
+
+        if ttl and cache_dir:
+            self.path = os.path.join(os.path.expanduser(cache_dir),
+                                     'zones-{0}.json'.format(api_key_hash(api_key)))
+            self.load()
+
+    def load(self):
+        data = read_json_file(self.path)
+        if not isinstance(data, dict):
+            return
+        if time.time() - data.get('timestamp', 0) > self.ttl:
+            return
+        self.timestamp = data['timestamp']
+        self.index = data.get('zones', {})
+
+    def get(self, zone_name):
+        return self.index.get(zone_name)
+
+    def update(self, zones):
+        self.index = dict((z['name'], z['uuid']) for z in zones)
+        self.timestamp = time.time()
+        self.save()
+
+    def invalidate(self):
+        self.index = {}
+        self.timestamp = 0
+        if self.path and os.path.exists(self.path):
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+
+    def save(self):
+        if not self.path:
+            return
+        try:
+            write_json_file(self.path, {'timestamp': self.timestamp,
+                                        'zones': self.index})
+        except (IOError, OSError):
+            # The cache is an optimization only
+            pass
+
+
+class NegativeCache(object):
+    """On-disk cache of the lookups that found nothing.
+
+    Zone names missing from the zone list and record URLs answered with a
+    404 are remembered for ttl seconds, in one file per API key. The file
+    is updated under a lock with the changes of this process only, so
+    that an entry dropped by a write of another process is not restored.
+    A ttl of 0 disables the cache.
+    """
+
+    def __init__(self, api_key, cache_dir, ttl):
+        self.ttl = ttl
+        self.path = None
+        self.entries = {}
+        self._lock = threading.Lock()
+
+        if ttl and cache_dir:
+            self.path = os.path.join(os.path.expanduser(cache_dir),
+                                     'missing-{0}.json'.format(api_key_hash(api_key)))
+            data = read_json_file(self.path)
+            if isinstance(data, dict):
+                self.entries = data
+
+    def missing(self, key):
+        if not self.path:
+            return False
+        timestamp = self.entries.get(key)
+        return isinstance(timestamp, (int, float)) and time.time() - timestamp <= self.ttl
+
+    def add(self, key):
+        if self.path:
+            self._update(added={key: time.time()})
+
+    def discard(self, url):
+        """Drop the entries of the records affected by a write on url.
+
+        The records of a zone are reached through /zones/<uuid> and through
+        /domains/<name>, the entries are matched on the part of their URL
+        after /records only, whatever the zone.
+        """
+        if not self.path:
+            return
+        written = self._record_path(url)
+        if written is None:
+            return
+        dropped = []
+        for k in self.entries:
+            record = self._record_path(k)
+            if record is not None and (record == written or not written or
+                                       record.startswith(written + '/') or
+                                       written.startswith(record + '/')):
+                dropped.append(k)
+        if dropped:
+            self._update(dropped=dropped)
+
+    @staticmethod
+    def _record_path(url):
+        parts = url.split('/')
+        if len(parts) < 4 or parts[1] not in ('zones', 'domains') or parts[3] != 'records':
+            return None
+        return '/'.join(parts[4:])
+
+    def _update(self, added=None, dropped=()):
+        with self._lock:
+            try:
+                dirname = os.path.dirname(self.path)
+                if not os.path.isdir(dirname):
+                    os.makedirs(dirname, 0o700)
+                with open(self.path + '.lock', 'a') as lock:
+                    fcntl.flock(lock, fcntl.LOCK_EX)
+                    try:
+                        data = read_json_file(self.path)
+                        if not isinstance(data, dict):
+                            data = {}
+                        now = time.time()
+                        data = dict((k, t) for k, t in data.items()
+                                    if k not in dropped and isinstance(t, (int, float)) and
+                                    now - t <= self.ttl)
+                        data.update(added or {})
+                        write_json_file(self.path, data)
+                        self.entries = data
+                    finally:
+                        fcntl.flock(lock, fcntl.LOCK_UN)
+            except (IOError, OSError):
+                # The cache is an optimization only
+                for key in dropped:
+                    self.entries.pop(key, None)
+
+
+def parse_retry_after(value):
+    """Return the number of seconds to wait from a Retry-After header."""
+    if not value:
+        return None
+    try:
+        return max(int(value), 0)
+    except ValueError:
+        pass
+    date = parsedate_tz(value)
+    if date is None:
+        return None
+    return max(mktime_tz(date) - time.time(), 0)
+
+
+class PushedState(object):
+    """Record of the rrsets successfully pushed to the API.
+
+    For each rrset, the state file keeps the last pushed state, values and
+    TTL, and when they were last checked against the API. A push of the
+    same data within recheck_interval seconds of the last check can be
+    skipped without any API call, a later one checks the remote records
+    again to catch changes made elsewhere.
+    """
+
+    def __init__(self, path, recheck_interval):
+        self.path = os.path.expanduser(path)
+        self.recheck_interval = recheck_interval
+
+    @staticmethod
+    def key(api_key, zone, domain, entry):
+        return '\0'.join([api_key_hash(api_key), zone or '', domain or '',
+                          entry['record'], entry['type']])
+
+    @staticmethod
+    def _data(entry, origin):
+        values = None
+        if entry['state'] == 'present':
+            values = sorted(canonical_values(entry['type'], entry['values'], origin))
+        return {'state': entry['state'], 'values': values,
+                'ttl': entry['ttl'] if entry['state'] == 'present' else None}
+
+    def unchanged(self, key, entry, origin=None):
+        """Return whether entry was pushed less than recheck_interval ago."""
+        pushed = (read_json_file(self.path) or {}).get(key)
+        if not isinstance(pushed, dict):
+            return False
+        if time.time() - pushed.get('checked', 0) > self.recheck_interval:
+            return False
+        return all(pushed.get(k) == v for k, v in self._data(entry, origin).items())
+
+    def update(self, key, entry, origin=None):
+        dirname = os.path.dirname(self.path)
+        if dirname and not os.path.isdir(dirname):
+            os.makedirs(dirname, 0o700)
+
+        # Several processes may update the file of a host at once
+        with open(self.path + '.lock', 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                data = read_json_file(self.path)
+                if not isinstance(data, dict):
+                    data = {}
+                data[key] = dict(self._data(entry, origin), checked=time.time())
+                write_json_file(self.path, data)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+class Checkpoint(object):
+    """Journal of the writes of a reconcile_records() plan.
+
+    The first line of the file holds the plan, the key of the parameters it
+    was computed from and the zone UUID, each following line the index of a
+    write done. An interrupted reconcile_records() given the checkpoint
+    again only sends the writes left, without looking up the zone and its
+    records. The file is removed once all the writes are done.
+    """
+
+    def __init__(self, path, key):
+        self.path = os.path.expanduser(path)
+        self.key = key
+        self.plan = None
+        self.zone_id = None
+        self.done = set()
+        self.resumed = False
+        self._file = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def params_key(api_key, zone, domain, entries, exclusive):
+        return hashlib.sha1(to_bytes(json.dumps(
+            [api_key_hash(api_key), zone, domain, entries, exclusive],
+            sort_keys=True))).hexdigest()
+
+    def load(self):
+        """Load the plan of the checkpoint file if it matches the key."""
+        try:
+            with open(self.path) as f:
+                header = json.loads(f.readline())
+                if not isinstance(header, dict) or header.get('key') != self.key:
+                    return None
+                done = set()
+                for line in f:
+                    try:
+                        done.add(int(line))
+                    except ValueError:
+                        # Last line cut by an interruption
+                        break
+        except (IOError, OSError, ValueError):
+            return None
+
+        self.plan = header['plan']
+        self.zone_id = header.get('zone_id')
+        self.done = done
+        self.resumed = True
+        return self.plan
+
+    def start(self, plan, zone_id):
+        dirname = os.path.dirname(self.path)
+        if dirname and not os.path.isdir(dirname):
+            os.makedirs(dirname, 0o700)
+
+        fd, tmp = tempfile.mkstemp(dir=dirname or '.', prefix='.tmp-')
+        with os.fdopen(fd, 'w') as f:
+            f.write(json.dumps({'key': self.key, 'zone_id': zone_id, 'plan': plan}) + '\n')
+        os.rename(tmp, self.path)
+
+        self.plan = plan
+        self.zone_id = zone_id
+        self.done = set()
+        self._file = open(self.path, 'a')
+
+    def record(self, index):
+        with self._lock:
+            self.done.add(index)
+            if self._file is None:
+                self._file = open(self.path, 'a')
+            self._file.write('{0}\n'.format(index))
+            self._file.flush()
+
+    def finish(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+class TokenBucket(object):
+    """Request rate limiter shared by all the processes of a machine.
+
+    The state of the bucket is kept in a file updated under an exclusive
+    lock, so that the forks of a playbook run using the same API key share
+    a single budget of rate requests per second.
+    """
+
+    def __init__(self, path, rate):
+        self.path = path
+        self.rate = float(rate)
+        self.burst = max(self.rate, 1)
+
+    def acquire(self):
+        while True:
+            try:
+                wait = self._take()
+            except (IOError, OSError):
+                # Rate limiting is best effort
+                return
+            if not wait:
+                return
+            time.sleep(wait)
+
+    def _take(self):
+        dirname = os.path.dirname(self.path)
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname, 0o700)
+
+        with open(self.path, 'a+') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                try:
+                    state = json.loads(f.read())
+                except ValueError:
+                    state = {}
+
+                now = time.time()
+                elapsed = max(now - state.get('timestamp', now), 0)
+                tokens = min(self.burst, state.get('tokens', self.burst) + elapsed * self.rate)
+                if tokens >= 1:
+                    tokens -= 1
+                    wait = 0
+                else:
+                    wait = (1 - tokens) / self.rate
+
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps({'tokens': tokens, 'timestamp': now}))
+                f.flush()
+                return wait
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class ResponseCache(object):
+    """On-disk cache of API responses revalidated with conditional requests.
+
+    Responses are stored with their ETag and Last-Modified headers, one
+    file per URL, in a directory specific to the API key. A cached response
+    is only used when the API answers 304 Not Modified.
+    """
+
+    def __init__(self, api_key, cache_dir):
+        self.path = os.path.join(os.path.expanduser(cache_dir),
+                                 'responses-{0}'.format(api_key_hash(api_key)))
+
+    def _entry_path(self, url):
+        return os.path.join(self.path, hashlib.sha1(to_bytes(url)).hexdigest() + '.json')
+
+    def get(self, url):
+        entry = read_json_file(self._entry_path(url))
+        if not isinstance(entry, dict) or entry.get('url') != url:
+            return None
+        return entry
+
+    def conditional_headers(self, entry):
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def set(self, url, headers, content):
+        etag = headers.get('etag')
+        last_modified = headers.get('last-modified')
+        if not etag and not last_modified:
+            return
+        try:
+            write_json_file(self._entry_path(url), {
+                'url': url,
+                'etag': etag,
+                'last_modified': last_modified,
+                'content': to_text(content, errors='surrogate_or_strict'),
+            })
+        except (IOError, OSError):
+            pass
+
+    def invalidate(self, url):
+        """Drop the responses affected by a write on url.
+
+        A write on /zones/<id>/records/<name>/<type> invalidates that
+        rrset, the records of <name> and the records of the zone.
+        """
+        parts = url.split('/')
+        if 'records' not in parts:
+            return
+        start = parts.index('records') + 1
+        for end in range(start, len(parts) + 1):
+            path = self._entry_path('/'.join(parts[:end]))
+            if os.path.exists(path):
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+
+
+class ZoneSnapshots(object):
+    """On-disk snapshots of the records of zones, to report their changes.
+
+    Each snapshot holds the records of a zone as last seen, with the serial
+    of the zone, the ETag of the response and a digest of the records, one
+    file per zone in a directory specific to the API key.
+    """
+
+    def __init__(self, api_key, cache_dir):
+        self.path = os.path.join(os.path.expanduser(cache_dir),
+                                 'snapshots-{0}'.format(api_key_hash(api_key)))
+
+    def _entry_path(self, key):
+        return os.path.join(self.path, hashlib.sha1(to_bytes(key)).hexdigest() + '.json')
+
+    def get(self, key):
+        entry = read_json_file(self._entry_path(key))
+        if not isinstance(entry, dict) or entry.get('key') != key or \
+                not isinstance(entry.get('records'), list):
+            return None
+        return entry
+
+    def set(self, key, etag, records, serial=None):
+        try:
+            write_json_file(self._entry_path(key), {
+                'key': key,
+                'serial': serial,
+                'etag': etag,
+                'digest': rrsets_digest(records),
+                'records': records,
+            })
+        except (IOError, OSError):
+            pass
+
+
+def _rrset_data(rrset):
+    return rrset.get('rrset_ttl'), sorted(rrset.get('rrset_values') or [])
+
+
+def rrsets_digest(rrsets):
+    """Return a digest of rrsets that does not depend on their order."""
+    items = sorted([rrset['rrset_name'], rrset['rrset_type']] + list(_rrset_data(rrset))
+                   for rrset in rrsets)
+    return hashlib.sha1(to_bytes(json.dumps(items))).hexdigest()
+
+
+def rrsets_delta(old, new):
+    """Compare two lists of rrsets.
+
+    Return the lists of the added and removed rrsets and the list of the
+    (old, new) pairs of the rrsets whose TTL or values changed.
+    """
+    old_rrsets = dict(((r['rrset_name'], r['rrset_type']), r) for r in old)
+    added = []
+    modified = []
+    for rrset in new:
+        previous = old_rrsets.pop((rrset['rrset_name'], rrset['rrset_type']), None)
+        if previous is None:
+            added.append(rrset)
+        elif _rrset_data(previous) != _rrset_data(rrset):
+            modified.append((previous, rrset))
+    removed = [r for r in old if (r['rrset_name'], r['rrset_type']) in old_rrsets]
+    return added, removed, modified
+
+
+_TTL_RE = re.compile(r'^(\d+[smhdw])+$', re.I)
+_TTL_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+
+
+def parse_ttl(value):
+    if value.isdigit():
+        return int(value)
+    if not _TTL_RE.match(value):
+        raise ValueError("invalid TTL {0}".format(value))
+    return sum(int(amount) * _TTL_UNITS[unit.lower()]
+               for amount, unit in re.findall(r'(\d+)([smhdw])', value, re.I))
+
+
+def _zone_file_tokens(line):
+    tokens = []
+    token = ''
+    quoted = False
+    escaped = False
+    for c in line:
+        if quoted:
+            token += c
+            if escaped:
+                escaped = False
+            elif c == '\\':
+                escaped = True
+            elif c == '"':
+                quoted = False
+            continue
+        if c == ';':
+            break
+        if c in ' \t\r\n()':
+            if token:
+                tokens.append(token)
+                token = ''
+            if c in '()':
+                tokens.append(c)
+            continue
+        if c == '"':
+            quoted = True
+        token += c
+    if quoted:
+        raise ValueError("unterminated quoted string")
+    if token:
+        tokens.append(token)
+    return tokens
+
+
+def _zone_file_lines(lines):
+    """Yield the logical lines of a zone file.
+
+    Each item is a (lineno, tokens, inherit_owner) tuple, records spanning
+    several lines with parentheses are joined.
+    """
+    tokens = []
+    depth = 0
+    start = 0
+    inherit_owner = False
+    for lineno, line in enumerate(lines, 1):
+        line = to_text(line, errors='surrogate_or_strict')
+        try:
+            line_tokens = _zone_file_tokens(line)
+        except ValueError as e:
+            raise ValueError("line {0}: {1}".format(lineno, to_native(e)))
+
+        if depth == 0:
+            tokens = []
+            start = lineno
+            inherit_owner = line[:1] in (' ', '\t')
+
+        for token in line_tokens:
+            if token == '(':
+                depth += 1
+            elif token == ')':
+                depth -= 1
+                if depth < 0:
+                    raise ValueError("line {0}: unbalanced parenthesis".format(lineno))
+            else:
+                tokens.append(token)
+
+        if depth == 0 and tokens:
+            yield start, tokens, inherit_owner
+
+    if depth:
+        raise ValueError("line {0}: unbalanced parenthesis".format(start))
+
+
+def _relative_name(name, origin, zone):
+    if name == '@':
+        fqdn = origin
+    elif name.endswith('.'):
+        fqdn = name[:-1]
+    elif origin:
+        fqdn = name + '.' + origin
+    else:
+        fqdn = name
+    fqdn = fqdn.lower()
+
+    if fqdn == zone:
+        return '@'
+    if fqdn.endswith('.' + zone):
+        return fqdn[:-len(zone) - 1]
+    raise ValueError("{0} is not part of zone {1}".format(fqdn, zone))
+
+
+def zone_file_entries(lines, zone, ttl=None):
+    """Parse the lines of a BIND zone file.
+
+    Yield a (name, type, ttl, value) tuple for each resource record, names
+    are relative to the zone.
+    """
+    zone = zone.rstrip('.').lower()
+    origin = zone
+    default_ttl = ttl
+    name = None
+
+    for lineno, tokens, inherit_owner in _zone_file_lines(lines):
+        try:
+            directive = tokens[0].upper()
+            if directive == '$ORIGIN':
+                origin = tokens[1].rstrip('.').lower()
+                continue
+            if directive == '$TTL':
+                default_ttl = parse_ttl(tokens[1])
+                continue
+            if directive.startswith('$'):
+                raise ValueError("unsupported directive {0}".format(tokens[0]))
+
+            if not inherit_owner:
+                name = _relative_name(tokens.pop(0), origin, zone)
+            elif name is None:
+                raise ValueError("missing owner name")
+
+            record_ttl = default_ttl
+            while tokens and (tokens[0][0].isdigit() or tokens[0].upper() in ('IN', 'CH', 'HS')):
+                token = tokens.pop(0)
+                if token[0].isdigit():
+                    record_ttl = parse_ttl(token)
+
+            type = tokens.pop(0).upper()
+            if not tokens:
+                raise ValueError("missing value for {0} record".format(type))
+        except IndexError:
+            raise ValueError("line {0}: incomplete record".format(lineno))
+        except ValueError as e:
+            raise ValueError("line {0}: {1}".format(lineno, to_native(e)))
+
+        yield name, type, record_ttl, ' '.join(tokens)
+
+
+def parse_zone_file(lines, zone, ttl=None):
+    """Group the records of a BIND zone file in LiveDNS rrsets.
+
+    The SOA record is managed by LiveDNS and is ignored.
+    """
+    rrsets = {}
+    order = []
+    for name, type, record_ttl, value in zone_file_entries(lines, zone, ttl):
+        if type == 'SOA':
+            continue
+        key = (name, type)
+        if key not in rrsets:
+            rrsets[key] = {
+                'rrset_name': name,
+                'rrset_type': type,
+                'rrset_ttl': record_ttl,
+                'rrset_values': [],
+            }
+            order.append(key)
+        rrsets[key]['rrset_values'].append(value)
+
+    return [rrsets[key] for key in order]
+
+
+# Record types whose values are a domain name, and the position of the
+# domain name in the fields of the value
+_NAME_FIELDS = {
+    'ALIAS': 0,
+    'CNAME': 0,
+    'DNAME': 0,
+    'NS': 0,
+    'PTR': 0,
+    'MX': 1,
+    'SRV': 3,
+}
+
+# Record types whose values end with hexadecimal data, and the number of
+# fields before it
+_HEX_FIELDS = {
+    'CDS': 3,
+    'DS': 3,
+    'SSHFP': 2,
+    'TLSA': 3,
+}
+
+
+def _character_strings(value):
+    """Split a TXT value in its character strings, unescaped."""
+    strings = []
+    current = None
+    escaped = False
+    for c in value:
+        if current is None:
+            if c == '"':
+                current = ''
+            elif not c.isspace():
+                # Unquoted value, taken as a whole
+                return [value.strip()]
+            continue
+        if escaped:
+            current += c
+            escaped = False
+        elif c == '\\':
+            escaped = True
+        elif c == '"':
+            strings.append(current)
+            current = None
+        else:
+            current += c
+    if current is not None:
+        return [value.strip()]
+    return strings
+
+
+def _canonical_name(name, origin):
+    name = name.lower()
+    if name == '@':
+        return origin + '.'
+    if name.endswith('.'):
+        return name
+    if origin:
+        return name + '.' + origin + '.'
+    return name
+
+
+def _canonical_address(family, value):
+    try:
+        return socket.inet_ntop(family, socket.inet_pton(family, value))
+    except (socket.error, ValueError):
+        return value
+
+
+def canonical_value(type, value, origin=None):
+    """Return the canonical form of a record value.
+
+    Values that are written differently but that describe the same record
+    data, e.g. relative and absolute names, quoted and unquoted TXT
+    strings or compressed IPv6 addresses, have the same canonical form.
+    Relative names are resolved against origin, the zone name.
+    """
+    origin = (origin or '').rstrip('.').lower()
+    value = to_text(value).strip()
+
+    if type in ('TXT', 'SPF'):
+        # Long strings are split by the API, compare their content
+        return ''.join(_character_strings(value))
+
+    if type == 'A':
+        return _canonical_address(socket.AF_INET, value)
+    if type == 'AAAA':
+        return _canonical_address(socket.AF_INET6, value).lower()
+
+    fields = value.split()
+    if type in _NAME_FIELDS and len(fields) == _NAME_FIELDS[type] + 1:
+        index = _NAME_FIELDS[type]
+        fields[index] = _canonical_name(fields[index], origin)
+        fields[:index] = [(f.lstrip('0') or '0') if f.isdigit() else f for f in fields[:index]]
+    elif type in _HEX_FIELDS and len(fields) > _HEX_FIELDS[type]:
+        index = _HEX_FIELDS[type]
+        fields[index:] = [''.join(fields[index:]).lower()]
+    elif type == 'CAA' and len(fields) >= 3:
+        fields[1] = fields[1].lower()
+        fields[2:] = [''.join(_character_strings(' '.join(fields[2:])))]
+
+    return ' '.join(fields)
+
+
+def canonical_values(type, values, origin=None):
+    """Return the set of the canonical forms of record values."""
+    return set(canonical_value(type, v, origin) for v in values)
+
+
+def merge_values(type, current, add=(), remove=(), origin=None):
+    """Return the values of current without remove and with add.
+
+    Values are compared by their canonical form, the order of current is
+    kept and the values of add it lacks are appended.
+    """
+    removed = canonical_values(type, remove, origin)
+    values = [v for v in current if canonical_value(type, v, origin) not in removed]
+    present = canonical_values(type, values, origin)
+    for value in add:
+        canonical = canonical_value(type, value, origin)
+        if canonical not in present:
+            values.append(value)
+            present.add(canonical)
+    return values
+
+
+def values_merged(type, current, add=(), remove=(), origin=None):
+    """Return whether current has all the values of add and none of remove."""
+    present = canonical_values(type, current, origin)
+    return canonical_values(type, add, origin) <= present and \
+        not canonical_values(type, remove, origin) & present
+
+
+class JSONArrayParser(object):
+    """Incremental decoder of a JSON array.
+
+    The body of a response is written to it by chunks, like to a file, and
+    each item of the array is passed to callback as soon as it is decoded.
+    Only the item being received is buffered, so that the memory used does
+    not grow with the size of the array.
+    """
+
+    _decoder = json.JSONDecoder()
+
+    def __init__(self, callback):
+        self.callback = callback
+        self._text = getincrementaldecoder('utf-8')()
+        self._buffer = ''
+        self._started = False
+        self._done = False
+
+    def write(self, data):
+        self._buffer += self._text.decode(data)
+        self._parse(final=False)
+
+    def close(self):
+        self._buffer += self._text.decode(b'', True)
+        self._parse(final=True)
+        if self._buffer.strip() or (self._started and not self._done):
+            raise ValueError("truncated JSON array")
+
+    def _parse(self, final):
+        buf = self._buffer
+        pos = 0
+        while True:
+            while pos < len(buf) and buf[pos] in ' \t\r\n':
+                pos += 1
+            if pos == len(buf) or self._done:
+                break
+            if not self._started:
+                if buf[pos] != '[':
+                    raise ValueError("expected a JSON array")
+                self._started = True
+                pos += 1
+                continue
+            if buf[pos] == ']':
+                self._done = True
+                pos += 1
+                continue
+            if buf[pos] == ',':
+                pos += 1
+                continue
+            try:
+                item, end = self._decoder.raw_decode(buf, pos)
+            except ValueError:
+                if final:
+                    raise
+                # Incomplete item, wait for more data
+                break
+            if end == len(buf) and not final:
+                # A number could go on in the next chunk
+                break
+            self.callback(item)
+            pos = end
+        self._buffer = buf[pos:]
+
+
+_PATH_TEMPLATES = [
+    (re.compile(r'^/zones/[^/]+'), '/zones/{zone_id}'),
+    (re.compile(r'^/domains/[^/]+'), '/domains/{domain}'),
+    (re.compile(r'/records/[^/]+/[^/]+$'), '/records/{name}/{type}'),
+    (re.compile(r'/records/[^/]+$'), '/records/{name}'),
+]
+
+
+def path_template(api_call):
+    """Return api_call with its zone, domain and record names replaced by
+    placeholders."""
+    for regexp, template in _PATH_TEMPLATES:
+        api_call = regexp.sub(template, api_call)
+    return api_call
+
+
+class Diagnostics(object):
+    """Timings of the API calls and of the phases of a module run."""
+
+    def __init__(self, start=None):
+        self.start = start or time.time()
+        self.calls = []
+        self.phases = {}
+        self._lock = threading.Lock()
+
+    def add_call(self, method, api_call, status, size, duration, retries):
+        with self._lock:
+            self.calls.append({
+                'method': method,
+                'path': path_template(api_call),
+                'status': status,
+                'bytes': size,
+                'duration': round(duration, 4),
+                'retries': retries,
+            })
+
+    def add_phase(self, name, duration):
+        with self._lock:
+            self.phases[name] = self.phases.get(name, 0) + duration
+
+    def report(self):
+        with self._lock:
+            return {
+                'api_calls': list(self.calls),
+                'api_call_count': len(self.calls),
+                'phases': dict((k, round(v, 4)) for k, v in self.phases.items()),
+                'elapsed': round(time.time() - self.start, 4),
+            }
+
+
+class _CountingWriter(object):
+    """File object wrapper counting the bytes written to it."""
+
+    def __init__(self, dest):
+        self.dest = dest
+        self.size = 0
+
+    def write(self, data):
+        self.size += len(data)
+        return self.dest.write(data)
+
+
+def _phase(name):
+    """Decorator adding the time spent in a method to a diagnostics phase."""
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if self.diagnostics is None:
+                return method(self, *args, **kwargs)
+            start = time.time()
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                self.diagnostics.add_phase(name, time.time() - start)
+        return wrapper
+    return decorator
+
+
+class GandiLiveDNSSession(object):
+    """Pool of persistent HTTP(S) connections to the LiveDNS API.
+
+    Connections are kept alive between requests so that several API calls
+    only pay for the TCP and TLS handshakes once.
+    """
+
+    def __init__(self, endpoint, validate_certs=True, timeout=10):
+        url = urlparse(endpoint)
+        self.scheme = url.scheme
+        self.host = url.hostname
+        self.port = url.port
+        self.base_path = url.path.rstrip('/')
+        self.validate_certs = validate_certs
+        self.timeout = timeout
+        self._pool = []
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self.scheme == 'https':
+            context = ssl.create_default_context()
+            if not self.validate_certs:
+                context.check_hostname = False
+                context.verify_mode = ssl.CERT_NONE
+            return http_client.HTTPSConnection(self.host, self.port,
+                                               timeout=self.timeout,
+                                               context=context)
+        return http_client.HTTPConnection(self.host, self.port,
+                                          timeout=self.timeout)
+
+    def _acquire(self):
+        with self._lock:
+            if self._pool:
+                return self._pool.pop(), True
+        return self._connect(), False
+
+    def _release(self, conn):
+        with self._lock:
+            self._pool.append(conn)
+
+    def _read_body(self, resp, write):
+        # Compressed bodies are inflated by chunks as they are received
+        decompressor = None
+        if resp.getheader('content-encoding', '').lower() == 'gzip':
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        while True:
+            chunk = resp.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            if decompressor:
+                chunk = decompressor.decompress(chunk)
+            write(chunk)
+        if decompressor:
+            write(decompressor.flush())
+
+    def request(self, method, path, headers=None, data=None, dest=None):
+        """Send a request and return its status, headers and body.
+
+        The response body is requested compressed and inflated on the fly.
+        If dest is a file object, a successful response body is written to
+        it by chunks instead of being returned.
+        """
+        headers = dict(headers or {})
+        headers.setdefault('Accept-Encoding', 'gzip')
+
+        conn, reused = self._acquire()
+        while True:
+            try:
+                conn.request(method, self.base_path + path, body=data,
+                             headers=headers)
+                resp = conn.getresponse()
+                break
+            except (http_client.HTTPException, socket.error):
+                conn.close()
+                if not reused:
+                    raise
+                # The server closed the idle connection, retry on a new one
+                conn, reused = self._connect(), False
+
+        content = None
+        try:
+            if dest is None or resp.status >= 400:
+                chunks = []
+                self._read_body(resp, chunks.append)
+                content = b''.join(chunks)
+            else:
+                self._read_body(resp, dest.write)
+        except Exception:
+            conn.close()
+            raise
+
+        if resp.will_close:
+            conn.close()
+        else:
+            self._release(conn)
+
+        resp_headers = dict((k.lower(), v) for k, v in resp.getheaders())
+        return resp.status, resp_headers, content
+
+    def close(self):
+        with self._lock:
+            for conn in self._pool:
+                conn.close()
+            self._pool = []
+
+
+_sessions = {}
+
+
+def get_session(endpoint, validate_certs=True):
+    """Return the session shared by all the API users of this process."""
+    key = (endpoint, validate_certs)
+    if key not in _sessions:
+        _sessions[key] = GandiLiveDNSSession(endpoint,
+                                             validate_certs=validate_certs)
+    return _sessions[key]
+
+
+def _identity(value):
+    return value
+
+
+class GandiLiveDNSError(Exception):
+    pass
+
+
+class StandaloneModule(object):
+    """Minimal stand-in for AnsibleModule.
+
+    It allows the API client to be used outside of a module, for instance
+    from plugins running on the controller. fail_json raises a
+    GandiLiveDNSError instead of exiting.
+    """
+
+    def __init__(self, params, check_mode=False):
+        self.params = dict((k, v.get('default'))
+                           for k, v in gandi_livedns_argument_spec().items())
+        self.params.update(params)
+        self.check_mode = check_mode
+        self.tmpdir = tempfile.gettempdir()
+
+    def fail_json(self, msg, **kwargs):
+        raise GandiLiveDNSError(msg)
+
+
+class GandiLiveDNSAPI(object):
+
+    api_endpoint = 'https://dns.api.gandi.net/api/v5'
+
+    error_strings = {
+        400: 'Bad request',
+        401: 'Permission denied',
+        404: 'Resource not found',
+    }
+
+    def __init__(self, module):
+        self.module = module
+        self.api_key = module.params['api_key']
+        self.zone = module.params['zone']
+        self.zone_id = module.params.get('zone_id')
+        self.domain = lowercase_string(module.params['domain'])
+        self.zone_cache = ZoneCache(self.api_key,
+                                    module.params['cache_dir'],
+                                    module.params['zone_cache_ttl'])
+        self.negative_cache = NegativeCache(self.api_key,
+                                            module.params['cache_dir'],
+                                            module.params.get('negative_cache_ttl') or 0)
+        # Zone UUIDs taken from the cache, by UUID, and the UUIDs found
+        # stale replaced by their current value
+        self._cached_zones = {}
+        self._zone_id_map = {}
+        self._zone_lock = threading.RLock()
+        self._local = threading.local()
+
+        self.response_cache = None
+        if module.params['response_cache'] and module.params['cache_dir']:
+            self.response_cache = ResponseCache(self.api_key,
+                                                module.params['cache_dir'])
+
+        self.parallelism = max(module.params.get('parallelism') or 1, 1)
+        self.retries = max(module.params['retries'], 0)
+
+        self.rate_limiter = None
+        if module.params['rate_limit'] and module.params['cache_dir']:
+            self.rate_limiter = TokenBucket(
+                os.path.join(os.path.expanduser(module.params['cache_dir']),
+                             'ratelimit-{0}.json'.format(api_key_hash(self.api_key))),
+                module.params['rate_limit'])
+
+        self.diagnostics = None
+        if module.params.get('diagnostics'):
+            self.diagnostics = Diagnostics()
+
+        self.session = None
+        if not module.params['use_fetch_url']:
+            self.session = get_session(self.api_endpoint,
+                                       module.params['validate_certs'])
+
+    def fail(self, msg):
+        # Errors are raised in the threads of run_parallel() and reported
+        # by the caller
+        if getattr(self._local, 'raise_errors', False):
+            raise GandiLiveDNSError(msg)
+        self.module.fail_json(msg=msg, **self.diagnostics_result())
+
+    @contextmanager
+    def phase(self, name):
+        """Add the time spent in the block to a diagnostics phase."""
+        start = time.time()
+        try:
+            yield
+        finally:
+            if self.diagnostics is not None:
+                self.diagnostics.add_phase(name, time.time() - start)
+
+    def diagnostics_result(self):
+        """Return the diagnostics to add to the result of a module."""
+        if self.diagnostics is None:
+            return {}
+        return {'diagnostics': self.diagnostics.report()}
+
+    def run_parallel(self, tasks):
+        """Run callables concurrently, at most parallelism at a time.
+
+        Return a (result, error) tuple for each callable, in the order of
+        tasks. An error does not prevent the other callables from running.
+        Exceptions other than GandiLiveDNSError are raised again once all
+        the callables ran.
+        """
+        outcomes = [None] * len(tasks)
+        unexpected = []
+        pending = queue.Queue()
+        for i, task in enumerate(tasks):
+            pending.put((i, task))
+
+        def worker():
+            self._local.raise_errors = True
+            while True:
+                try:
+                    i, task = pending.get_nowait()
+                except queue.Empty:
+                    return
+                try:
+                    outcomes[i] = (task(), None)
+                except GandiLiveDNSError as e:
+                    outcomes[i] = (None, to_native(e))
+                except Exception as e:
+                    unexpected.append(e)
+
+        threads = [threading.Thread(target=worker)
+                   for dummy in range(min(self.parallelism, len(tasks)))]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        if unexpected:
+            raise unexpected[0]
+        return outcomes
+
+    def _should_retry(self, method, status):
+        if method not in ('GET', 'PUT', 'DELETE'):
+            return status in RETRY_UNAPPLIED_STATUSES
+        # The request may have been applied before an internal error
+        return status in RETRY_STATUSES or status == 500
+
+    def _retry_delay(self, attempt, headers):
+        retry_after = parse_retry_after(headers.get('retry-after'))
+        if retry_after is not None:
+            return min(retry_after, RETRY_MAX_DELAY) + random.uniform(0, 1)
+        # Exponential backoff with full jitter
+        return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+
+    def _request(self, api_call, method, headers, data, dest=None):
+        if self.session is None:
+            # Only imported when used, it is slow to import
+            from ansible.module_utils.urls import fetch_url
+            resp, info = fetch_url(self.module,
+                                   self.api_endpoint + api_call,
+                                   headers=headers,
+                                   data=data,
+                                   method=method)
+            content = None
+            if resp is not None:
+                if dest is not None:
+                    shutil.copyfileobj(resp, dest, CHUNK_SIZE)
+                else:
+                    content = resp.read()
+            return info['status'], info, content
+
+        try:
+            status, resp_headers, content = self.session.request(
+                method, api_call, headers=headers, data=data, dest=dest)
+        except (http_client.HTTPException, socket.error, ssl.SSLError) as e:
+            self.fail("Failed to connect to {0}: {1}".format(
+                self.api_endpoint, to_native(e)))
+        if status >= 400:
+            content = None
+        return status, resp_headers, content
+
+    def _gandi_api_call(self, api_call, method='GET', payload=None, error_on_404=True,
+                        headers=None, dest=None, response_headers=None):
+        # Updated by the other threads of run_parallel()
+        with self._zone_lock:
+            zone_id_map = list(self._zone_id_map.items())
+        for stale_id, zone_id in zone_id_map:
+            api_call = api_call.replace(stale_id, zone_id)
+
+        extra_headers = headers
+        headers = {'X-Api-Key': self.api_key,
+                   'Content-Type': 'application/json'}
+        if extra_headers:
+            headers.update(extra_headers)
+        data = None
+        if payload:
+            try:
+                data = json.dumps(payload)
+            except Exception as e:
+                self.fail("Failed to encode payload as JSON: %s " % to_native(e))
+
+        cached = None
+        if self.response_cache and method == 'GET' and dest is None:
+            cached = self.response_cache.get(api_call)
+            if cached:
+                headers.update(self.response_cache.conditional_headers(cached))
+
+        counter = None
+        if self.diagnostics and dest is not None:
+            dest = counter = _CountingWriter(dest)
+        start = time.time()
+
+        for attempt in range(self.retries + 1):
+            if self.rate_limiter:
+                self.rate_limiter.acquire()
+            status, resp_headers, content = self._request(api_call, method, headers, data, dest=dest)
+            if attempt == self.retries or not self._should_retry(method, status):
+                break
+            time.sleep(self._retry_delay(attempt, resp_headers))
+
+        if self.diagnostics:
+            self.diagnostics.add_call(method, api_call, status,
+                                      counter.size if counter else len(content or b''),
+                                      time.time() - start, attempt)
+
+        if response_headers is not None:
+            response_headers.update(resp_headers or {})
+
+        if cached and status == 304:
+            status, content = 200, cached['content']
+        elif self.response_cache and status < 400:
+            if method == 'GET':
+                if dest is None:
+                    self.response_cache.set(api_call, resp_headers, content)
+            else:
+                self.response_cache.invalidate(api_call)
+
+        if method != 'GET':
+            written = api_call
+            if method == 'POST' and payload and payload.get('rrset_name'):
+                # Creation of an rrset, named in the payload
+                written += '/%s/%s' % (payload['rrset_name'], payload['rrset_type'])
+            self.negative_cache.discard(written)
+
+        with self._zone_lock:
+            stale_ids = [zone_id for zone_id in self._cached_zones if zone_id in api_call]
+            if status == 404 and stale_ids:
+                # The zone UUID comes from the cache, check that it is still valid
+                stale_id = stale_ids[0]
+                zone_name = self._cached_zones.pop(stale_id)
+                if self._zone_missing(stale_id, api_call):
+                    self.zone_cache.invalidate()
+                    self._zone_id_map[stale_id] = self._get_zone_id(zone_name)
+            retry = status == 404 and any(stale_id in api_call and zone_id != stale_id
+                                          for stale_id, zone_id in self._zone_id_map.items())
+        if retry:
+            return self._gandi_api_call(api_call, method=method, payload=payload,
+                                        error_on_404=error_on_404,
+                                        headers=extra_headers, dest=dest,
+                                        response_headers=response_headers)
+
+        error_msg = ''
+        if status >= 400 and (status != 404 or error_on_404):
+            err_s = self.error_strings.get(status, '')
+
+            error_msg = "API error {0}; Status: {1}; Method: {2}: Call: {3}".format(err_s, status, method, api_call)
+
+        result = None
+        if content:
+            try:
+                result = json.loads(to_text(content, errors='surrogate_or_strict'))
+            except (getattr(json, 'JSONDecodeError', ValueError)) as e:
+                error_msg += "; Failed to parse API response with error {0}: {1}".format(to_native(e), content)
+
+        if error_msg:
+            self.fail(error_msg)
+
+        return result, status
+
+    def _zone_missing(self, zone_id, api_call):
+        """Return whether a 404 on api_call means that zone_id does not exist.
+
+        A 404 on a record is common with a valid zone (a new or deleted
+        rrset), the zone itself is requested to tell.
+        """
+        zone_url = '/zones/%s' % (zone_id)
+        if api_call in (zone_url, zone_url + '/records'):
+            return True
+        result, status = self._gandi_api_call(zone_url, error_on_404=False)
+        return status == 404
+
+    def build_result(self, result):
+        if result is None:
+            return None
+
+        res = {}
+        for k in ('name', 'type', 'ttl', 'values'):
+            v = result.get('rrset_' + k, None)
+            if v is not None:
+                res[k] = v
+
+        if self.zone:
+            res['zone'] = self.zone
+        else:
+            res['domain'] = self.domain
+
+        return res
+
+    def record_differs(self, record, values, ttl):
+        if ttl is not None and record['rrset_ttl'] != ttl:
+            return True
+        if values is not None:
+            type = record['rrset_type']
+            origin = self.zone or self.domain
+            if canonical_values(type, record['rrset_values'], origin) != canonical_values(type, values, origin):
+                return True
+        return False
+
+    def reconcile_records(self, entries, zone_id=None, domain=None, exclusive=False,
+                          verify=False, checkpoint=None):
+        """Converge the records of a zone to the desired entries.
+
+        entries are dicts as returned by record_entries(). The zone records
+        are fetched once and diffed locally so that only the required
+        writes are sent, concurrently for different rrsets. With
+        exclusive, the records that are not listed are purged and the zone
+        is replaced with a single request. With verify, the zone records
+        are fetched again after the writes and compared to the entries.
+
+        The values of the entries in append or remove values_mode are
+        merged with the values of the rrset, and checked after the writes
+        (see merge_record()).
+
+        With a Checkpoint, the writes done are journaled, and the plan of
+        a checkpoint loaded from an interrupted call is resumed instead of
+        being computed again.
+
+        Return the result of each entry, whether the zone changed and the
+        list of purged records (None when not exclusive). The result of an
+        entry whose write failed has failed and msg keys.
+        """
+        plan = checkpoint.plan if checkpoint is not None else None
+        if plan is None:
+            plan = self.plan_records(entries, zone_id=zone_id, domain=domain, exclusive=exclusive)
+            if checkpoint is not None and plan['writes']:
+                checkpoint.start(plan, zone_id)
+        results = plan['results']
+
+        applied, merge_time = self.apply_plan(plan, checkpoint=checkpoint,
+                                              zone_id=zone_id, domain=domain)
+        if applied and checkpoint is not None:
+            checkpoint.finish()
+
+        if plan['merges'] and plan['writes'] and not exclusive:
+            # Like in merge_record(), concurrent writes land before the check
+            time.sleep(min(merge_time, MERGE_SETTLE_MAX_DELAY))
+            self.remerge_records(entries, results, zone_id=zone_id, domain=domain)
+
+        if verify and plan['changed'] and not self.module.check_mode:
+            self.verify_records(entries, results, zone_id=zone_id, domain=domain)
+
+        return results, plan['changed'], plan['purged']
+
+    def plan_records(self, entries, zone_id=None, domain=None, exclusive=False):
+        """Diff the entries of reconcile_records() with the zone records.
+
+        Return the plan as a dict holding the results of the entries, the
+        changed, purged and merges (any entry in append or remove
+        values_mode) flags and the list of the writes to send. Each write
+        names the rrset it applies to (None for the zone), the API method
+        and its arguments, and the indexes of the entries it is for. There
+        are no writes in check mode.
+        """
+        current = {}
+        for r in self.get_records(None, None, zone_id=zone_id, domain=domain) or []:
+            current[(r['rrset_name'], r['rrset_type'])] = r
+
+        # In exclusive mode, the whole zone is replaced with a single request
+        # once the desired record set has been computed
+        apply = not (self.module.check_mode or exclusive)
+
+        zone_changed = False
+        results = []
+        writes = {}
+        desired = set()
+        merges = False
+        for index, entry in enumerate(entries):
+            name = entry['record']
+            type = entry['type']
+            values = entry['values']
+            ttl = entry['ttl']
+            state = entry['state']
+            values_mode = entry.get('values_mode', 'replace')
+
+            record = current.get((name, type))
+            if state == 'present' and values_mode != 'replace':
+                merges = True
+                if values_mode == 'append':
+                    values = merge_values(type, record['rrset_values'] if record else [], add=values,
+                                          origin=self.zone or self.domain)
+                elif record:
+                    values = merge_values(type, record['rrset_values'], remove=values,
+                                          origin=self.zone or self.domain)
+                    ttl = record['rrset_ttl']
+                else:
+                    values = []
+                if not values:
+                    # Removing the last values of an rrset deletes it
+                    state = 'absent'
+
+            if state == 'present':
+                desired.add((name, type))
+
+            changed = False
+            result = record
+            write = None
+
+            if state == 'absent':
+                if record:
+                    changed = True
+                    write = {'call': 'delete_record', 'args': [name, type],
+                             'kwargs': {'error_on_404': values_mode == 'replace'}}
+                    del current[(name, type)]
+                result = None
+            elif record is None:
+                changed = True
+                # Another client may create the rrset to merge into concurrently
+                create = 'update_record' if values_mode == 'append' else 'create_record'
+                write = {'call': create, 'args': [name, type, values, ttl], 'kwargs': {}}
+                result = {
+                    'rrset_name': name,
+                    'rrset_type': type,
+                    'rrset_values': values,
+                    'rrset_ttl': ttl,
+                }
+                current[(name, type)] = result
+            elif self.record_differs(record, values, ttl):
+                changed = True
+                write = {'call': 'update_record', 'args': [name, type, values, ttl], 'kwargs': {}}
+                result = dict(record, rrset_values=values, rrset_ttl=ttl)
+                current[(name, type)] = result
+
+            if changed:
+                zone_changed = True
+
+            item = {'state': entry['state'], 'changed': changed}
+            if entry['state'] == 'present':
+                item['record'] = self.build_result(result)
+            results.append(item)
+
+            if apply and write:
+                write.update(rrset=[name, type], items=[index], merge=values_mode != 'replace')
+                writes.setdefault((name, type), []).append(write)
+
+        plan_writes = []
+        for key in sorted(writes):
+            rrset_writes = writes[key]
+            if all(write['merge'] for write in rrset_writes):
+                # Each merge includes the values of the previous ones, only
+                # the last write is sent
+                rrset_writes[-1]['items'] = [i for write in rrset_writes for i in write['items']]
+                rrset_writes = rrset_writes[-1:]
+            plan_writes.extend(rrset_writes)
+
+        purged = None
+        if exclusive:
+            purged = []
+            for key in sorted(k for k in current if k not in desired):
+                purged.append(self.build_result(current.pop(key)))
+
+            if purged:
+                zone_changed = True
+
+            if zone_changed and not self.module.check_mode:
+                plan_writes.append({'rrset': None, 'items': [], 'call': 'replace_records',
+                                    'args': [list(current.values())], 'kwargs': {}})
+
+        return {
+            'results': results,
+            'changed': zone_changed,
+            'purged': purged,
+            'merges': merges,
+            'writes': plan_writes,
+        }
+
+    def apply_plan(self, plan, checkpoint=None, zone_id=None, domain=None):
+        """Send the writes of a plan_records() plan that are not done yet.
+
+        Return whether all of them succeeded and the longest time taken by
+        a write merging values.
+        """
+        results = plan['results']
+        done = checkpoint.done if checkpoint is not None else set()
+
+        rrset_writes = {}
+        zone_writes = []
+        for i, write in enumerate(plan['writes']):
+            if i in done:
+                continue
+            if write['rrset'] is None:
+                zone_writes.append((i, write))
+            else:
+                rrset_writes.setdefault(tuple(write['rrset']), []).append((i, write))
+
+        resumed = checkpoint is not None and checkpoint.resumed
+        merge_times = [0]
+
+        def send(i, write):
+            start = time.time()
+            call, kwargs = write['call'], write['kwargs']
+            if resumed:
+                # The interrupted call may have sent the write without
+                # journaling it, send it in a way that can be repeated
+                if call == 'create_record':
+                    call = 'update_record'
+                elif call == 'delete_record':
+                    kwargs = dict(kwargs, error_on_404=False)
+            getattr(self, call)(*write['args'], zone_id=zone_id, domain=domain, **kwargs)
+            if write.get('merge'):
+                merge_times.append(time.time() - start)
+            if checkpoint is not None:
+                checkpoint.record(i)
+
+        failed = []
+
+        # The writes of different rrsets are independent from each other,
+        # the writes of a same rrset are sent in order
+        def apply_writes(writes):
+            for i, write in writes:
+                try:
+                    send(i, write)
+                except GandiLiveDNSError as e:
+                    failed.append(i)
+                    for index in write['items']:
+                        results[index]['failed'] = True
+                        results[index]['msg'] = to_native(e)
+
+        self.run_parallel([partial(apply_writes, rrset_writes[key])
+                           for key in sorted(rrset_writes)])
+
+        for i, write in zone_writes:
+            send(i, write)
+
+        return not failed, max(merge_times)
+
+    def remerge_records(self, entries, results, zone_id=None, domain=None):
+        """Merge again the values of the entries of reconcile_records() in
+        append or remove values_mode that concurrent updates dropped."""
+        # The values each rrset must and must not have after all its entries
+        merges = {}
+        origin = self.zone or self.domain
+        for i, entry in enumerate(entries):
+            key = (entry['record'], entry['type'])
+            values_mode = entry.get('values_mode', 'replace')
+            if entry['state'] == 'absent' or values_mode == 'replace':
+                merges.pop(key, None)
+                continue
+            merge = merges.setdefault(key, {'add': [], 'remove': [], 'ttl': None, 'items': []})
+            values = canonical_values(entry['type'], entry['values'], origin)
+            if values_mode == 'append':
+                merge['remove'] = [v for v in merge['remove']
+                                   if canonical_value(entry['type'], v, origin) not in values]
+                merge['add'] += entry['values']
+                merge['ttl'] = entry['ttl']
+            else:
+                merge['add'] = [v for v in merge['add']
+                                if canonical_value(entry['type'], v, origin) not in values]
+                merge['remove'] += entry['values']
+            merge['items'].append(results[i])
+
+        merges = dict((key, merge) for key, merge in merges.items()
+                      if any(item['changed'] and not item.get('failed') for item in merge['items']))
+        if not merges:
+            return
+
+        current = {}
+        for r in self.get_records(None, None, zone_id=zone_id, domain=domain) or []:
+            current[(r['rrset_name'], r['rrset_type'])] = r
+
+        def remerge(key, merge):
+            record = current.get(key)
+            if values_merged(key[1], record['rrset_values'] if record else [],
+                             merge['add'], merge['remove'], origin):
+                return
+            try:
+                record, dummy = self.merge_record(key[0], key[1], merge['ttl'], add=merge['add'],
+                                                  remove=merge['remove'], zone_id=zone_id, domain=domain)
+            except GandiLiveDNSError as e:
+                for item in merge['items']:
+                    item['failed'] = True
+                    item['msg'] = to_native(e)
+                return
+            for item in merge['items']:
+                item['record'] = self.build_result(record)
+
+        self.run_parallel([partial(remerge, key, merges[key]) for key in sorted(merges)])
+
+    def merge_record(self, name, type, ttl, add=(), remove=(), zone_id=None, domain=None):
+        """Add and remove values of an rrset with a read-merge-write.
+
+        The API has no conditional writes, the rrset is read back after
+        each write, once the write of a concurrent client that read the
+        rrset before it had time to land. When a concurrent update dropped
+        the merged values, they are merged and written again after a
+        backoff delay, up to retries times. The TTL is only set when values are added and the
+        rrset is deleted when no value is left.
+
+        Return the rrset (None if there is none) and whether it changed.
+        """
+        origin = self.zone or self.domain
+
+        def merged(record):
+            if record is None:
+                return not add
+            return values_merged(type, record['rrset_values'], add, remove, origin) and \
+                (not add or ttl is None or record['rrset_ttl'] == ttl)
+
+        def get_record():
+            records = self.get_records(name, type, zone_id=zone_id, domain=domain)
+            return records[0] if records else None
+
+        changed = False
+        for attempt in range(self.retries + 1):
+            if changed:
+                # The values written were dropped by a concurrent update
+                time.sleep(self._retry_delay(attempt - 1, {}))
+
+            start = time.time()
+            record = get_record()
+            if merged(record):
+                return record, changed
+
+            values = merge_values(type, record['rrset_values'] if record else [], add, remove, origin)
+            if record is None or (add and ttl is not None):
+                record_ttl = ttl
+            else:
+                record_ttl = record['rrset_ttl']
+            result = None
+            if values:
+                result = {
+                    'rrset_name': name,
+                    'rrset_type': type,
+                    'rrset_values': values,
+                    'rrset_ttl': record_ttl,
+                }
+            if self.module.check_mode:
+                return result, True
+
+            if values:
+                self.update_record(name, type, values, record_ttl, zone_id=zone_id, domain=domain)
+            else:
+                self.delete_record(name, type, zone_id=zone_id, domain=domain, error_on_404=False)
+            changed = True
+
+            # Concurrent clients take about as long between their read and
+            # their write
+            time.sleep(min(time.time() - start, MERGE_SETTLE_MAX_DELAY))
+            record = get_record()
+            if merged(record):
+                return record, changed
+
+        self.fail("Record {0} of type {1} was updated concurrently, its values could not be merged after {2} attempt(s)".format(
+            name, type, self.retries + 1))
+
+    def verify_records(self, entries, results, zone_id=None, domain=None):
+        """Compare the records of the zone to the entries applied by
+        reconcile_records() and update their results from the zone."""
+        current = {}
+        for r in self.get_records(None, None, zone_id=zone_id, domain=domain) or []:
+            current[(r['rrset_name'], r['rrset_type'])] = r
+
+        # Only the last entry of an rrset describes its final state
+        last = dict(((entry['record'], entry['type']), i) for i, entry in enumerate(entries))
+
+        for i, (entry, item) in enumerate(zip(entries, results)):
+            if not item['changed'] or item.get('failed') or last[(entry['record'], entry['type'])] != i:
+                continue
+            if entry.get('values_mode', 'replace') != 'replace':
+                # Checked by remerge_records()
+                continue
+            record = current.get((entry['record'], entry['type']))
+            if entry['state'] == 'absent':
+                mismatch = record is not None
+            else:
+                mismatch = record is None or self.record_differs(record, entry['values'], entry['ttl'])
+                if record is not None:
+                    item['record'] = self.build_result(record)
+            if mismatch:
+                item['failed'] = True
+                item['msg'] = "Record {0} of type {1} does not match the requested state after its update".format(
+                    entry['record'], entry['type'])
+
+    def open_checkpoint(self, path, entries, zone=None, domain=None, exclusive=False):
+        """Return a Checkpoint of path for reconcile_records() and the zone UUID.
+
+        The zone UUID of a checkpoint holding a plan for the same parameters
+        is used without looking it up, it is looked up again if the API
+        reports it as not found.
+        """
+        checkpoint = Checkpoint(path, Checkpoint.params_key(self.api_key, zone, domain,
+                                                            entries, exclusive))
+        if checkpoint.load() is None:
+            return checkpoint, self._get_zone_id(zone) if zone else None
+
+        if zone and checkpoint.zone_id:
+            with self._zone_lock:
+                self._cached_zones[checkpoint.zone_id] = zone
+        return checkpoint, checkpoint.zone_id
+
+    @_phase('zone_resolution')
+    def _get_zone_id(self, zone_name):
+        if self.zone_id and zone_name == self.zone:
+            # Given by the user, used as is
+            return self.zone_id
+
+        # Concurrent lookups share a single listing of the zones
+        with self._zone_lock:
+            zone_id = self.zone_cache.get(zone_name)
+            if zone_id:
+                self._cached_zones[zone_id] = zone_name
+                return zone_id
+
+            if not self.negative_cache.missing('zone:' + zone_name):
+                self.zone_cache.update(self.get_zones())
+                zone_id = self.zone_cache.get(zone_name)
+                if zone_id:
+                    return zone_id
+                self.negative_cache.add('zone:' + zone_name)
+        self.fail("No zone found with name {0}".format(zone_name))
+
+    def get_zones(self):
+        zones, status = self._gandi_api_call('/zones')
+        return zones
+
+    @_phase('read')
+    def get_records(self, name, type, zone_id=None, domain=None, build=None,
+                    cached_misses=False):
+        """Return the records of a zone, of a name or of a rrset.
+
+        If build is set, it is called on each record and its results are
+        returned instead. The records of a whole zone are then decoded and
+        built one at a time as the response is received.
+
+        With cached_misses, the names and rrsets found missing by a
+        previous run (see NegativeCache) are reported missing without any
+        API call. It is only set by read-only callers, a write based on a
+        cached miss could fail on a record created since.
+        """
+        if zone_id:
+            url = '/zones/%s' % (zone_id)
+        else:
+            url = '/domains/%s' % (domain)
+
+        url += '/records'
+        if name:
+            url += '/%s' % (name)
+            if type:
+                url += '/%s' % (type)
+
+        if build is None:
+            build = _identity
+
+        if not name and self.response_cache is None:
+            records = []
+
+            def add_record(record):
+                if isinstance(record, dict) and (not type or record.get('rrset_type') == type):
+                    records.append(build(record))
+
+            parser = JSONArrayParser(add_record)
+            try:
+                result, status = self._gandi_api_call(url, error_on_404=False, dest=parser)
+                if status == 404:
+                    return None
+                parser.close()
+            except ValueError as e:
+                self.fail("Failed to parse API response with error {0}".format(to_native(e)))
+            return records
+
+        if name and cached_misses and self.negative_cache.missing(url):
+            return None
+
+        records, status = self._gandi_api_call(url, error_on_404=False)
+
+        if status == 404:
+            if name:
+                self.negative_cache.add(url)
+            return None
+
+        if not isinstance(records, list):
+            records = [records]
+
+        # filter by type if name is not set
+        if not name and type:
+            records = [r
+                       for r in records
+                       if r['rrset_type'] == type]
+
+        return [build(r) for r in records]
+
+    @_phase('read')
+    def get_zone_changes(self, snapshots, key, zone_id=None, domain=None, save=True):
+        """Return the records of a zone and its snapshot of key.
+
+        The serial of a zone is checked first, its records are not
+        downloaded when it is the serial of the snapshot. The records are
+        requested with the ETag of the snapshot, so that the API does not
+        send them again if it supports conditional requests (domains have
+        no serial). Return the records, the records of the previous
+        snapshot (None if there was none) and whether they are unchanged.
+        The snapshot is updated if save is set.
+        """
+        snapshot = snapshots.get(key)
+
+        serial = None
+        if zone_id:
+            zone, status = self._gandi_api_call('/zones/%s' % (zone_id), error_on_404=False)
+            if status == 404:
+                return None, None, False
+            if isinstance(zone, dict):
+                serial = zone.get('serial')
+            if snapshot and serial is not None and snapshot.get('serial') == serial:
+                return snapshot['records'], snapshot['records'], True
+            url = '/zones/%s/records' % (zone_id)
+        else:
+            url = '/domains/%s/records' % (domain)
+
+        headers = {}
+        if snapshot and snapshot.get('etag'):
+            headers['If-None-Match'] = snapshot['etag']
+
+        records = []
+
+        def add_record(record):
+            if isinstance(record, dict):
+                records.append(record)
+
+        parser = JSONArrayParser(add_record)
+        response_headers = {}
+        try:
+            result, status = self._gandi_api_call(url, error_on_404=False, dest=parser, headers=headers,
+                                                  response_headers=response_headers)
+            if status == 404:
+                return None, None, False
+            if status == 304:
+                return snapshot['records'], snapshot['records'], True
+            parser.close()
+        except ValueError as e:
+            self.fail("Failed to parse API response with error {0}".format(to_native(e)))
+
+        previous = None
+        unchanged = False
+        if snapshot:
+            previous = snapshot['records']
+            unchanged = snapshot.get('digest') == rrsets_digest(records)
+        if save:
+            snapshots.set(key, response_headers.get('etag'), records, serial=serial)
+        return records, previous, unchanged
+
+    @_phase('write')
+    def create_record(self, name, type, values, ttl,
+                      zone_id=None, domain=None):
+        if zone_id:
+            url = '/zones/%s' % (zone_id)
+        else:
+            url = '/domains/%s' % (domain)
+
+        url += '/records'
+        new_record = {
+            'rrset_name': name,
+            'rrset_type': type,
+            'rrset_values': values,
+            'rrset_ttl': ttl,
+        }
+        record, status = self._gandi_api_call(
+            url,
+            method='POST',
+            payload=new_record)
+
+        if status in (201,):
+            return new_record
+
+        return None
+
+    @_phase('write')
+    def update_record(self, name, type, values, ttl,
+                      zone_id=None, domain=None):
+        if zone_id:
+            url = '/zones/%s' % (zone_id)
+        else:
+            url = '/domains/%s' % (domain)
+
+        url += '/records/%s/%s' % (name, type)
+        new_record = {
+            'rrset_values': values,
+            'rrset_ttl': ttl,
+        }
+        record, status = self._gandi_api_call(
+            url,
+            method='PUT',
+            payload=new_record)
+        return record
+
+    @_phase('write')
+    def replace_records(self, records, zone_id=None, domain=None):
+        if zone_id:
+            url = '/zones/%s' % (zone_id)
+        else:
+            url = '/domains/%s' % (domain)
+
+        url += '/records'
+        items = []
+        for r in records:
+            items.append(dict((k, r[k]) for k in ('rrset_name', 'rrset_type',
+                                                  'rrset_values', 'rrset_ttl')))
+        record, status = self._gandi_api_call(
+            url,
+            method='PUT',
+            payload={'items': items})
+        return record
+
+    @_phase('read')
+    def export_zone_file(self, dest, zone_id=None, domain=None):
+        if zone_id:
+            url = '/zones/%s' % (zone_id)
+        else:
+            url = '/domains/%s' % (domain)
+
+        url += '/records'
+        self._gandi_api_call(url, headers={'Accept': 'text/plain'}, dest=dest)
+
+    @_phase('write')
+    def delete_record(self, name, type, zone_id=None, domain=None, error_on_404=True):
+        if zone_id:
+            url = '/zones/%s' % (zone_id)
+        else:
+            url = '/domains/%s' % (domain)
+        url += '/records/%s/%s' % (name, type)
+
+        if not error_on_404 and self.negative_cache.missing(url):
+            return False
+
+        record, status = self._gandi_api_call(
+            url,
+            method='DELETE',
+            error_on_404=error_on_404)
+
+        if status == 404:
+            self.negative_cache.add(url)
+        return status != 404
+
+
+def shared_records_key(params):
+    """Return the key of the records of a zone shared by the controller
+    plugins during a playbook run."""
+    return hashlib.sha1(to_bytes('\0'.join([
+        api_key_hash(params['api_key']),
+        params['zone'] or '',
+        params['domain'] or '',
+    ]))).hexdigest()
+
+
+def fetch_zone_records(params):
+    """Return all the records of a zone or domain as result dicts.
+
+    Raise GandiLiveDNSError on failure.
+    """
+    api = GandiLiveDNSAPI(StandaloneModule(params))
+    zone_id = None
+    if api.zone:
+        zone_id = api._get_zone_id(api.zone)
+    return api.get_records(None, None, zone_id=zone_id, domain=api.domain,
+                           build=api.build_result) or []
+
+
+def _shared_records_path(tmpdir, params):
+    return os.path.join(tmpdir, 'gandi_livedns-records-{0}.json'.format(
+        shared_records_key(params)))
+
+
+def shared_zone_records(tmpdir, params):
+    """Return all the records of a zone or domain, fetched once per run.
+
+    The records are kept in a file of tmpdir, the local temporary directory
+    of the playbook run. The workers of the run share it, a lock prevents
+    concurrent workers from fetching the same zone all at once. Raise
+    GandiLiveDNSError if the zone cannot be fetched, the next call tries
+    again.
+    """
+    path = _shared_records_path(tmpdir, params)
+    with open(path + '.lock', 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            data = read_json_file(path)
+            if not isinstance(data, dict) or 'records' not in data:
+                data = {'records': fetch_zone_records(params)}
+                try:
+                    write_json_file(path, data)
+                except (IOError, OSError):
+                    pass
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+    return data['records']
+
+
+def shared_records_version(tmpdir, params):
+    """Return an identifier of the shared copy of a zone, None if there is none.
+
+    It changes each time the copy is dropped and fetched again, for the
+    callers keeping the records in memory.
+    """
+    try:
+        st = os.stat(_shared_records_path(tmpdir, params))
+    except OSError:
+        return None
+    return (st.st_ino, st.st_mtime)
+
+
+def drop_shared_zone_records(tmpdir, params):
+    """Drop the shared copies of a zone or domain after a write.
+
+    A zone and the domain of the same name are usually the same records,
+    the copies of both are dropped.
+    """
+    name = params.get('zone') or params.get('domain')
+    for zone, domain in set([(name, None), (None, name), (None, lowercase_string(name))]):
+        path = _shared_records_path(tmpdir, dict(params, zone=zone, domain=domain))
+        if not os.path.exists(path):
+            continue
+        try:
+            with open(path + '.lock', 'a') as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                try:
+                    os.unlink(path)
+                finally:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+        except (IOError, OSError):
+            pass
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2019 Gregory Thiemonge <gregory.thiemonge@gmail.com>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+
+import importlib.util
+import json
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+from livedns_stub import BASE_PATH, LiveDNSState, start_server  # noqa: E402
+
+ZONE = 'example.com'
+
+
+def _load(name, path):
+    if name not in sys.modules:
+        spec = importlib.util.spec_from_file_location(name, path)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[name] = module
+        spec.loader.exec_module(module)
+    return sys.modules[name]
+
+
+def load_module_utils():
+    """Import the module_utils of this tree as Ansible would ship it."""
+    return _load('ansible.module_utils.gandi_livedns_api',
+                 os.path.join(ROOT, 'module_utils', 'gandi_livedns_api.py'))
+
+
+@pytest.fixture
+def livedns():
+    """Serve a zone of 10 records (h0 to h9) on the LiveDNS stub."""
+    state = LiveDNSState()
+    state.add_zone(ZONE, 10)
+    server = start_server(state)
+    state.endpoint = 'http://127.0.0.1:{0}{1}'.format(server.server_port, BASE_PATH)
+    try:
+        yield state
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def run_module(livedns, tmp_path, capsys, monkeypatch):
+    """Run a module of library/ in process against the stub.
+
+    Return its result and the requests it sent, as (method, path) tuples
+    relative to the API endpoint.
+    """
+    pytest.importorskip('ansible')
+    from ansible.module_utils import basic
+
+    module_utils = load_module_utils()
+    monkeypatch.setattr(module_utils.GandiLiveDNSAPI, 'api_endpoint', livedns.endpoint)
+
+    def run(name, **args):
+        args = dict({'api_key': 'test', 'zone': ZONE,
+                     'cache_dir': str(tmp_path / 'cache')}, **args)
+        # None unsets a default, a None value would still count as given
+        args = dict((k, v) for k, v in args.items() if v is not None)
+        # Given as the file argument of a module run by hand, which all the
+        # ansible-core versions read (the variables holding the arguments
+        # and their serialization changed in 2.19)
+        path = tmp_path / 'args.json'
+        path.write_text(json.dumps({'ANSIBLE_MODULE_ARGS': args}))
+        monkeypatch.setattr(sys, 'argv', [name, str(path)])
+        monkeypatch.setattr(basic, '_ANSIBLE_ARGS', None)
+        # Not imported by name, gandi_livedns is also the command line package
+        module = _load('library_' + name, os.path.join(ROOT, 'library', name + '.py'))
+
+        livedns.reset_counters()
+        capsys.readouterr()
+        with pytest.raises(SystemExit):
+            module.main()
+        result = json.loads(capsys.readouterr().out)
+        requests = [(method, path[len(BASE_PATH):]) for method, path in livedns.requests]
+        return result, requests
+
+    return run
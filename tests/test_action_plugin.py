@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2019 Gregory Thiemonge <gregory.thiemonge@gmail.com>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+"""Run playbooks using the gandi_livedns action plugin against the stub."""
+
+from __future__ import absolute_import, division, print_function
+
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from conftest import ROOT, ZONE
+
+# Run ansible-playbook with the module_utils of this tree pointing to the
+# stub, the forked workers of the run inherit them
+RUNNER = r'''
+import importlib.util, os, sys
+
+root, endpoint = sys.argv[1], sys.argv[2]
+
+name = 'ansible.module_utils.gandi_livedns_api'
+spec = importlib.util.spec_from_file_location(name, os.path.join(root, 'module_utils', 'gandi_livedns_api.py'))
+module_utils = importlib.util.module_from_spec(spec)
+sys.modules[name] = module_utils
+spec.loader.exec_module(module_utils)
+module_utils.GandiLiveDNSAPI.api_endpoint = endpoint
+
+from ansible.cli.playbook import main
+main(['ansible-playbook'] + sys.argv[3:])
+'''
+
+HOSTS = ['host0', 'host1', 'host2', 'host3']
+
+
+@pytest.fixture
+def playbook(livedns, tmp_path):
+    """Run a playbook on HOSTS and return the registered r of each host."""
+    pytest.importorskip('ansible')
+
+    inventory = tmp_path / 'inventory'
+    inventory.write_text(u''.join(
+        u'{0} ansible_connection=local ansible_python_interpreter={1}\n'.format(host, sys.executable)
+        for host in HOSTS))
+
+    def run(tasks):
+        path = tmp_path / 'playbook.yml'
+        path.write_text(json.dumps([{
+            'hosts': 'all',
+            'gather_facts': False,
+            'tasks': tasks + [{
+                'copy': {'content': '{{ r | to_json }}',
+                         'dest': str(tmp_path / '{{ inventory_hostname }}.json')},
+            }],
+        }]))
+        env = dict(os.environ,
+                   ANSIBLE_ACTION_PLUGINS=os.path.join(ROOT, 'action_plugins'),
+                   ANSIBLE_LIBRARY=os.path.join(ROOT, 'library'),
+                   ANSIBLE_LOOKUP_PLUGINS=os.path.join(ROOT, 'lookup_plugins'),
+                   ANSIBLE_MODULE_UTILS=os.path.join(ROOT, 'module_utils'),
+                   ANSIBLE_LOCAL_TEMP=str(tmp_path / 'tmp'),
+                   ANSIBLE_FORKS=str(len(HOSTS)))
+        proc = subprocess.run([sys.executable, '-c', RUNNER, ROOT, livedns.endpoint,
+                               '-i', str(inventory), str(path)],
+                              stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                              universal_newlines=True, env=env)
+        assert proc.returncode == 0, proc.stdout
+        return dict((host, json.loads((tmp_path / '{0}.json'.format(host)).read_text()))
+                    for host in HOSTS)
+
+    return run
+
+
+def record_task(**args):
+    return {'gandi_livedns': dict({'api_key': 'test', 'zone': ZONE, 'zone_cache_ttl': 0}, **args),
+            'register': 'r'}
+
+
+def zone_values(livedns):
+    records = livedns.zone_records('domains', ZONE)
+    return dict((name, r['rrset_values']) for (name, type), r in records.items())
+
+
+def test_loop(playbook, livedns):
+    """Each item of a loop is applied, not only the first one."""
+    task = record_task(record='{{ inventory_hostname }}-{{ item }}', type='A',
+                       values=['192.0.2.{{ item }}'])
+    task['loop'] = [1, 2, 3]
+    results = playbook([task])
+
+    values = zone_values(livedns)
+    for host in HOSTS:
+        assert [item['changed'] for item in results[host]['results']] == [True] * 3
+        for i in (1, 2, 3):
+            assert values['{0}-{1}'.format(host, i)] == ['192.0.2.{0}'.format(i)]
+
+
+def test_until(playbook):
+    """Each attempt of until is applied, the second one finds the records up to date."""
+    task = record_task(record='{{ inventory_hostname }}', type='A', values=['192.0.2.1'])
+    task.update({'until': 'r.attempts >= 2', 'retries': 2, 'delay': 0})
+    results = playbook([task])
+
+    for host in HOSTS:
+        assert results[host]['attempts'] == 2
+        assert not results[host]['changed']
+
+
+def test_shared_copy_dropped_after_write(playbook):
+    """The lookup and the shared facts see the records written earlier in the run."""
+    lookup = "{{ lookup('gandi_livedns', inventory_hostname, zone='%s', api_key='test', zone_cache_ttl=0) }}" % ZONE
+    results = playbook([
+        {'set_fact': {'before': lookup}},
+        record_task(record='{{ inventory_hostname }}', type='A', values=['192.0.2.1']),
+        {'set_fact': {'after': lookup}},
+        {'gandi_livedns_facts': {'api_key': 'test', 'zone': ZONE, 'zone_cache_ttl': 0,
+                                 'record': '{{ inventory_hostname }}', 'shared': True},
+         'register': 'facts'},
+        {'set_fact': {'r': {'before': '{{ before }}', 'after': '{{ after }}',
+                            'facts': '{{ gandi_livedns_facts.records }}'}}},
+    ])
+
+    for host in HOSTS:
+        assert results[host]['before'] in ('', [])
+        assert results[host]['after'] == '192.0.2.1'
+        assert [r['values'] for r in results[host]['facts']] == [['192.0.2.1']]
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2019 Gregory Thiemonge <gregory.thiemonge@gmail.com>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+"""Check the API calls of gandi_livedns against the budget of its notes."""
+
+from __future__ import absolute_import, division, print_function
+
+import pytest
+
+from conftest import ZONE
+
+
+@pytest.fixture
+def zone_url(livedns):
+    return '/zones/' + livedns.domains[ZONE]
+
+
+@pytest.fixture
+def warm(run_module):
+    """Fill the zone cache, the following runs find the zone UUID in it."""
+    run_module('gandi_livedns', record='h0', type='A', values=['198.51.0.0'])
+
+
+def test_cold_zone_cache(run_module, zone_url):
+    result, requests = run_module('gandi_livedns', record='h0', type='A', values=['192.0.2.1'])
+    assert result['changed']
+    assert requests == [
+        ('GET', '/zones'),
+        ('GET', zone_url + '/records/h0/A'),
+        ('PUT', zone_url + '/records/h0/A'),
+    ]
+
+
+@pytest.mark.parametrize('args, changed, calls', [
+    # state=present: one GET of the record, then one PUT or POST if needed
+    (dict(record='h0', type='A', values=['198.51.0.0']), False, [('GET', '/records/h0/A')]),
+    (dict(record='h0', type='A', values=['192.0.2.1']), True,
+     [('GET', '/records/h0/A'), ('PUT', '/records/h0/A')]),
+    # state=absent: a single DELETE, a GET in check mode
+    (dict(record='h0', type='A', state='absent'), True, [('DELETE', '/records/h0/A')]),
+    (dict(record='h0', type='A', state='absent', _ansible_check_mode=True), True,
+     [('GET', '/records/h0/A')]),
+    # verify reads back each changed record
+    (dict(record='h0', type='A', values=['192.0.2.1'], verify=True), True,
+     [('GET', '/records/h0/A'), ('PUT', '/records/h0/A'), ('GET', '/records/h0/A')]),
+    # records: one GET of the zone plus one request per changed record
+    (dict(records=[dict(record='h0', type='A', values=['198.51.0.0']),
+                   dict(record='h1', type='A', values=['192.0.2.1']),
+                   dict(record='h2', type='A', state='absent')]), True,
+     [('GET', '/records'), ('PUT', '/records/h1/A'), ('DELETE', '/records/h2/A')]),
+    # exclusive: the same GET and a single PUT of the zone
+    (dict(records=[dict(record='h0', type='A', values=['192.0.2.1'])], exclusive=True), True,
+     [('GET', '/records'), ('PUT', '/records')]),
+])
+def test_budget(warm, run_module, zone_url, args, changed, calls):
+    result, requests = run_module('gandi_livedns', **args)
+    assert not result.get('failed'), result.get('msg')
+    assert result['changed'] == changed
+    assert requests == [(method, zone_url + path) for method, path in calls]
+
+
+@pytest.mark.parametrize('args, calls', [
+    (dict(record='new', type='A', values=['192.0.2.1']),
+     [('GET', '/records/new/A'), ('POST', '/records')]),
+    (dict(record='new', type='A', state='absent'),
+     [('DELETE', '/records/new/A')]),
+])
+def test_cached_zone_checked_on_404(warm, run_module, zone_url, args, calls):
+    """A record not found costs a single GET of the zone, not of the zone list."""
+    result, requests = run_module('gandi_livedns', **args)
+    assert not result.get('failed'), result.get('msg')
+    calls.insert(1, ('GET', ''))
+    assert requests == [(method, zone_url + path) for method, path in calls]
+
+
+def test_stale_cached_zone(warm, run_module, livedns, zone_url):
+    """A zone recreated with a new UUID is looked up again."""
+    new_zone_url = '/zones/' + livedns.add_zone(ZONE, 10)
+    result, requests = run_module('gandi_livedns', record='h0', type='A', values=['192.0.2.1'])
+    assert result['changed']
+    assert requests == [
+        ('GET', zone_url + '/records/h0/A'),
+        ('GET', zone_url),
+        ('GET', '/zones'),
+        ('GET', new_zone_url + '/records/h0/A'),
+        ('PUT', new_zone_url + '/records/h0/A'),
+    ]
+
+
+@pytest.mark.parametrize('module, args', [
+    ('gandi_livedns', dict(record='h0', type='A', values=['192.0.2.1'])),
+    ('gandi_livedns', dict(record='h0', type='A', state='absent')),
+    ('gandi_livedns', dict(records=[dict(record='h0', type='A', values=['192.0.2.1'])])),
+    ('gandi_livedns_facts', dict()),
+    ('gandi_livedns_facts', dict(zone=None, zones=['example.com'])),
+    ('gandi_livedns_facts', dict(track_changes=True)),
+])
+def test_diagnostics_results_phase(run_module, module, args):
+    result, requests = run_module(module, diagnostics=True, **args)
+    assert 'results' in result['diagnostics']['phases']
+    assert result['diagnostics']['api_call_count'] == len(requests)
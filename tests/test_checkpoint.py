@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2019 Gregory Thiemonge <gregory.thiemonge@gmail.com>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+"""Check the checkpoint journal of gandi_livedns bulk updates."""
+
+from __future__ import absolute_import, division, print_function
+
+import errno
+import os
+
+from conftest import load_module_utils
+
+
+def records(values):
+    return [dict(record='h{0}'.format(i), type='A', values=[values]) for i in range(4)]
+
+
+def test_journal_write_error(run_module, monkeypatch, tmp_path):
+    """A journal that cannot be written fails the task and is kept."""
+    checkpoint = load_module_utils().Checkpoint
+    record = checkpoint.record
+
+    def full_disk(self, index):
+        if self.done:
+            raise OSError(errno.ENOSPC, os.strerror(errno.ENOSPC))
+        record(self, index)
+
+    monkeypatch.setattr(checkpoint, 'record', full_disk)
+    path = tmp_path / 'checkpoint'
+    result, requests = run_module('gandi_livedns', records=records('192.0.2.1'),
+                                  checkpoint_file=str(path), parallelism=2)
+    assert result['failed']
+    assert 'Failed to write checkpoint file' in result['msg']
+    assert path.exists()
+
+    # The writes left are sent when resumed
+    monkeypatch.setattr(checkpoint, 'record', record)
+    result, requests = run_module('gandi_livedns', records=records('192.0.2.1'),
+                                  checkpoint_file=str(path), parallelism=2)
+    assert not result.get('failed'), result.get('msg')
+    assert not path.exists()
+    assert [method for method, url in requests] == ['PUT'] * 3
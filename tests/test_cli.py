@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2019 Gregory Thiemonge <gregory.thiemonge@gmail.com>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+"""Run the python -m gandi_livedns entry point against the stub."""
+
+from __future__ import absolute_import, division, print_function
+
+import pytest
+
+from conftest import ROOT, ZONE, load_module_utils
+
+
+@pytest.fixture
+def cli(livedns, monkeypatch, tmp_path):
+    pytest.importorskip('ansible')
+    monkeypatch.setattr(load_module_utils().GandiLiveDNSAPI, 'api_endpoint', livedns.endpoint)
+    monkeypatch.syspath_prepend(ROOT)
+    monkeypatch.setenv('HOME', str(tmp_path))
+    monkeypatch.setenv('GANDI_LIVEDNS_API_KEY', 'test')
+    from gandi_livedns.__main__ import main
+
+    def run(*argv):
+        livedns.reset_counters()
+        return main(list(argv)), [method for method, path in livedns.requests]
+
+    return run
+
+
+@pytest.mark.parametrize('origin', [
+    ['--zone', ZONE],
+    ['--domain', ZONE],
+    ['--zone', ZONE, '--zone-id', 'ZONE_ID'],
+])
+def test_ddns(cli, livedns, tmp_path, origin):
+    origin = [livedns.domains[ZONE] if arg == 'ZONE_ID' else arg for arg in origin]
+    state_file = str(tmp_path / 'state.json')
+    status, requests = cli('ddns', '--record', 'home', '--state-file', state_file, '192.0.2.1', *origin)
+    assert status == 0
+    assert 'POST' in requests
+
+    # Pushed already, no API call
+    assert cli('ddns', '--record', 'home', '--state-file', state_file, '192.0.2.1', *origin) == (0, [])
+
+
+@pytest.mark.parametrize('content', [
+    u'zone: example.com\n',
+    u'zone: example.com\nrecords:\n',
+    u'zone: [example.com\n',
+])
+def test_sync_rejected(cli, livedns, tmp_path, capsys, content):
+    """Invalid desired states fail with a message, nothing is purged."""
+    pytest.importorskip('yaml')
+    desired = tmp_path / 'desired.yaml'
+    desired.write_text(content)
+    assert cli('sync', str(desired), '--exclusive') == (1, [])
+    assert capsys.readouterr().err.startswith('error: ')
+    assert len(livedns.zone_records('zones', livedns.domains[ZONE])) == 10
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2019 Gregory Thiemonge <gregory.thiemonge@gmail.com>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+"""Check the zone changes reported by gandi_livedns_facts track_changes."""
+
+from __future__ import absolute_import, division, print_function
+
+from conftest import ZONE
+
+
+def test_zone_serial(run_module, livedns):
+    """An unchanged zone costs a single GET of the zone, without its records."""
+    zone_url = '/zones/' + livedns.domains[ZONE]
+    result, requests = run_module('gandi_livedns_facts', track_changes=True)
+    assert len(result['ansible_facts']['gandi_livedns_facts']['changes']['added']) == 10
+
+    result, requests = run_module('gandi_livedns_facts', track_changes=True)
+    assert result['ansible_facts']['gandi_livedns_facts']['unchanged']
+    assert requests == [('GET', zone_url)]
+
+    run_module('gandi_livedns', record='h0', type='A', values=['192.0.2.1'])
+    result, requests = run_module('gandi_livedns_facts', track_changes=True)
+    facts = result['ansible_facts']['gandi_livedns_facts']
+    assert not facts['unchanged']
+    assert [(r['name'], r['values'], r['previous']['values']) for r in facts['changes']['modified']] == \
+        [('h0', ['192.0.2.1'], ['198.51.0.0'])]
+    assert requests == [('GET', zone_url), ('GET', zone_url + '/records')]
+
+
+def test_domain_etag(run_module):
+    run_module('gandi_livedns_facts', zone=None, domain=ZONE, track_changes=True)
+    result, requests = run_module('gandi_livedns_facts', zone=None, domain=ZONE, track_changes=True)
+    assert result['ansible_facts']['gandi_livedns_facts']['unchanged']
+    assert requests == [('GET', '/domains/{0}/records'.format(ZONE))]
+
+
+def test_unknown_zone_id(run_module):
+    result, requests = run_module('gandi_livedns_facts', zone_id='00000000-0000-0000-0000-000000000000',
+                                  track_changes=True)
+    assert result['failed']
+    assert result['msg'] == 'Domain {0} not found'.format(ZONE)
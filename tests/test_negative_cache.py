@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2019 Gregory Thiemonge <gregory.thiemonge@gmail.com>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+"""Check the records remembered missing with negative_cache_ttl."""
+
+from __future__ import absolute_import, division, print_function
+
+from conftest import ZONE
+
+
+def absent(run_module, **args):
+    return run_module('gandi_livedns', record='new', type='A', state='absent',
+                      negative_cache_ttl=300, **args)
+
+
+def test_absent_cached(run_module):
+    absent(run_module)
+    result, requests = absent(run_module)
+    assert not result['changed']
+    assert requests == []
+
+
+def test_created_elsewhere(run_module, livedns):
+    """A cached miss does not make a later creation fail."""
+    absent(run_module)
+    livedns.zone_records('domains', ZONE)[('new', 'A')] = {
+        'rrset_name': 'new', 'rrset_type': 'A', 'rrset_ttl': 10800, 'rrset_values': ['192.0.2.2'],
+    }
+    result, requests = run_module('gandi_livedns', record='new', type='A', values=['192.0.2.1'],
+                                  negative_cache_ttl=300)
+    assert not result.get('failed'), result.get('msg')
+    assert result['changed']
+    assert [method for method, url in requests] == ['GET', 'PUT']
+
+
+def test_write_through_zone_forgets_domain_entry(run_module, livedns):
+    absent(run_module, zone=None, domain=ZONE)
+    run_module('gandi_livedns', record='new', type='A', values=['192.0.2.1'],
+               negative_cache_ttl=300)
+
+    result, requests = absent(run_module, zone=None, domain=ZONE)
+    assert result['changed']
+    assert requests == [('DELETE', '/domains/{0}/records/new/A'.format(ZONE))]
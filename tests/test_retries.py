@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2019 Gregory Thiemonge <gregory.thiemonge@gmail.com>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+"""Check which failed requests are retried."""
+
+from __future__ import absolute_import, division, print_function
+
+import pytest
+
+from conftest import load_module_utils
+
+
+@pytest.fixture
+def api():
+    pytest.importorskip('ansible')
+    module_utils = load_module_utils()
+    return module_utils.GandiLiveDNSAPI(module_utils.StandaloneModule({'api_key': 'test'}))
+
+
+@pytest.mark.parametrize('status', [429, 500, 502, 503, 504])
+@pytest.mark.parametrize('method', ['GET', 'PUT', 'DELETE'])
+def test_idempotent_requests_retried(api, method, status):
+    assert api._should_retry(method, status)
+
+
+@pytest.mark.parametrize('status, retried', [
+    (429, True),
+    (503, True),
+    # The record may have been created, a retry would get a 409
+    (500, False),
+    (502, False),
+    (504, False),
+])
+def test_create_retried(api, status, retried):
+    assert api._should_retry('POST', status) == retried
+
+
+@pytest.mark.parametrize('method', ['GET', 'POST'])
+@pytest.mark.parametrize('status', [400, 401, 404, 409])
+def test_client_errors_not_retried(api, method, status):
+    assert not api._should_retry(method, status)
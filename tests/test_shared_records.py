@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2019 Gregory Thiemonge <gregory.thiemonge@gmail.com>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+"""Check the copy of the zones shared by the controller plugins."""
+
+from __future__ import absolute_import, division, print_function
+
+import pytest
+
+from conftest import ZONE, load_module_utils
+
+
+@pytest.fixture
+def api(livedns, monkeypatch):
+    pytest.importorskip('ansible')
+    module_utils = load_module_utils()
+    monkeypatch.setattr(module_utils.GandiLiveDNSAPI, 'api_endpoint', livedns.endpoint)
+    return module_utils
+
+
+@pytest.fixture
+def params(api):
+    return dict((k, v.get('default')) for k, v in api.gandi_livedns_argument_spec().items())
+
+
+def test_fetch_error_not_kept(api, params, livedns, tmp_path):
+    params.update(api_key='test', zone=ZONE, zone_cache_ttl=0, retries=0)
+    livedns.error_rate = 1
+    with pytest.raises(api.GandiLiveDNSError):
+        api.shared_zone_records(str(tmp_path), params)
+
+    livedns.error_rate = 0
+    assert len(api.shared_zone_records(str(tmp_path), params)) == 10
+
+
+def test_dropped_copy_fetched_again(api, params, livedns, tmp_path):
+    params.update(api_key='test', domain=ZONE, zone_cache_ttl=0)
+    api.shared_zone_records(str(tmp_path), params)
+    version = api.shared_records_version(str(tmp_path), params)
+    livedns.reset_counters()
+    api.shared_zone_records(str(tmp_path), params)
+    assert livedns.requests == []
+
+    # Written through the zone of the same name
+    api.drop_shared_zone_records(str(tmp_path), dict(params, zone=ZONE, domain=None))
+    assert api.shared_records_version(str(tmp_path), params) is None
+    api.shared_zone_records(str(tmp_path), params)
+    assert len(livedns.requests) == 1
+    assert api.shared_records_version(str(tmp_path), params) != version